@@ -7,6 +7,7 @@ router under a path defined by the WEBHOOK_PATH environment variable.
 
 from __future__ import annotations
 
+import logging
 import os
 from urllib.parse import urlsplit, urlunsplit
 
@@ -14,6 +15,14 @@ from fastapi import FastAPI
 
 from .db import init_models
 from .routes import get_whatsapp_router
+from .services.outbound_queue import stop_worker as stop_outbound_queue
+from .services.http_clients import aclose_clients
+from .services.uazapi_service import start_outbound_queue, warmup
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
 
 app = FastAPI(title="Luna Backend (Uazapi + OpenAI)")
 
@@ -55,6 +64,14 @@ async def on_startup() -> None:
         print(f"[startup] Webhook PATH = {webhook_path} (defina PUBLIC_BASE_URL para ver URL completa)")
 
     await init_models()
+    start_outbound_queue()
+    await warmup()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await stop_outbound_queue()
+    await aclose_clients()
 
 
 # ---- Routers (mount after startup helpers are defined) ----
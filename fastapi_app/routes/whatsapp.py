@@ -14,9 +14,9 @@ Fluxo resumido:
 from __future__ import annotations
 
 import asyncio
+import logging
 import os
 import re
-import traceback
 import unicodedata
 from datetime import datetime, timedelta
 from typing import Any, Dict, Optional, Tuple, List
@@ -29,9 +29,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..db import get_db, SessionLocal
 from ..models.db_models import Message, User
 from ..services.openai_service import ask_assistant, get_or_create_thread
-from ..services.uazapi_service import send_whatsapp_message, send_menu_interesse
+from ..services.uazapi_service import normalize_number, send_bulk, send_whatsapp_message, send_menu_interesse
 
 router = APIRouter(tags=["whatsapp-webhook"])
+logger = logging.getLogger(__name__)
 
 # =========================== ENV & helpers ===========================
 
@@ -107,7 +108,7 @@ NAME_RETRY_TEMPLATE = _env_template("NAME_RETRY_TEMPLATE", "Desculpe, não enten
 def _env_token() -> str:
     token = os.getenv("WEBHOOK_VERIFY_TOKEN", "")
     if not token:
-        print("[warn] WEBHOOK_VERIFY_TOKEN is not set; webhook aceitará qualquer request.")
+        logger.warning("WEBHOOK_VERIFY_TOKEN is not set; webhook aceitará qualquer request.")
     return token
 
 def _extract_token_from_request(request: Request, header_token: Optional[str]) -> Optional[str]:
@@ -162,8 +163,7 @@ TEXT_KEYS_PRIORITY = (
     "caption",
 )
 
-def _only_digits(s: str) -> str:
-    return "".join(ch for ch in str(s) if ch.isdigit())
+_only_digits = normalize_number
 
 def _strip_accents(s: str) -> str:
     if not s:
@@ -333,7 +333,7 @@ def _extract_sender_and_type(event: Dict[str, Any]) -> Dict[str, Optional[str]]:
     if phone:
         digits = _only_digits(phone)
         if len(digits) < 10:
-            print(f"[webhook] phone_too_short extracted={phone} sample={str(event)[:200]}")
+            logger.info("[webhook] phone_too_short extracted=%s sample=%.200s", phone, event)
             phone = None
 
     return {"phone": phone, "msg_type": msg_type, "text": text}
@@ -370,7 +370,7 @@ async def _has_recent_generic(session: AsyncSession, user_id: int, media_type: s
             last_at = last_at.replace(tzinfo=None)
         return (now - last_at) <= timedelta(minutes=minutes)
     except Exception as exc:
-        print(f"[state] erro ao consultar {media_type} recente: {exc!r}")
+        logger.warning("[state] erro ao consultar %s recente: %r", media_type, exc)
         return False
 
 async def _has_recent_menu(session: AsyncSession, user_id: int, minutes: int = 30) -> bool:
@@ -577,7 +577,7 @@ def _build_handoff_text(user: User, phone: str, last_msg: Optional[str]) -> str:
     try:
         return tpl.format(name=name, digits=digits, last=last, wa_link=wa_link)
     except Exception as exc:
-        print(f"[handoff] template format error: {exc!r}; usando fallback.")
+        logger.warning("[handoff] template format error: %r; usando fallback.", exc)
         return (
             "Novo lead aguardando contato (Luna — Verbo Vídeo)\n"
             f"Nome: {name}\nTelefone: +{digits}\nÚltima mensagem: {last}\nOrigem: WhatsApp\n"
@@ -587,15 +587,14 @@ def _build_handoff_text(user: User, phone: str, last_msg: Optional[str]) -> str:
 async def _notify_consultants(session: AsyncSession, *, user: User, phone: str, user_text: Optional[str]) -> None:
     targets = _parse_notify_numbers(HANDOFF_NOTIFY_NUMBERS)
     if not targets:
-        print("[handoff] HANDOFF_NOTIFY_NUMBERS vazio ou inválido; nenhuma notificação enviada.")
+        logger.warning("[handoff] HANDOFF_NOTIFY_NUMBERS vazio ou inválido; nenhuma notificação enviada.")
         return
     last = (user_text or "").strip() or await _get_last_user_text(session, user.id)
     alert = _build_handoff_text(user, phone, last)
-    for t in targets:
-        try:
-            await send_whatsapp_message(phone=t, content=alert, type_="text")
-        except Exception as e:
-            print(f"[handoff] falha ao notificar {t}: {e!r}")
+    results = await send_bulk([{"phone": t, "content": alert, "type_": "text"} for t in targets])
+    for t, r in zip(targets, results):
+        if isinstance(r, BaseException):
+            logger.warning("[handoff] falha ao notificar %s: %r", t, r)
     session.add(Message(user_id=user.id, sender="assistant", content=alert, media_type="handoff"))
     await session.commit()
 
@@ -608,7 +607,7 @@ async def _send_handoff_offer(session: AsyncSession, *, phone: str, user: User,
     try:
         await send_whatsapp_message(phone=phone, content=text, type_="text")
     except Exception as e:
-        print(f"[handoff] falha ao enviar oferta: {e!r}")
+        logger.warning("[handoff] falha ao enviar oferta: %r", e)
     session.add(Message(user_id=user.id, sender="assistant", content=text, media_type="handoff_offer"))
     await session.commit()
 
@@ -708,14 +707,14 @@ async def _assistant_asked_name_recent(session: AsyncSession, user_id: int, minu
                 return True
         return False
     except Exception as exc:
-        print(f"[state] erro asked_name_recent: {exc!r}")
+        logger.warning("[state] erro asked_name_recent: %r", exc)
         return False
 
 # --------- Ações de saída ---------
 
 async def _enviar_menu(session: AsyncSession, phone: str, user: User) -> None:
     if not LUNA_MENU_TEXT:
-        print("[menu] LUNA_MENU_TEXT não definido; caixinha foi pulada.")
+        logger.warning("[menu] LUNA_MENU_TEXT não definido; caixinha foi pulada.")
         return
     try:
         await send_menu_interesse(
@@ -727,9 +726,9 @@ async def _enviar_menu(session: AsyncSession, phone: str, user: User) -> None:
         )
         session.add(Message(user_id=user.id, sender="assistant", content=LUNA_MENU_TEXT, media_type="menu"))
         await session.commit()
-        print("[menu] enviado com sucesso.")
+        logger.info("[menu] enviado com sucesso.")
     except Exception as exc:
-        print(f"[menu] falha ao enviar menu: {exc!r}")
+        logger.warning("[menu] falha ao enviar menu: %r", exc)
 
 async def _enviar_video(session: AsyncSession, phone: str, user: User) -> None:
     if not LUNA_VIDEO_URL:
@@ -745,18 +744,18 @@ async def _enviar_video(session: AsyncSession, phone: str, user: User) -> None:
         )
         session.add(Message(user_id=user.id, sender="assistant", content=LUNA_VIDEO_URL, media_type="video"))
         await session.commit()
-        print("[video] enviado com sucesso.")
+        logger.info("[video] enviado com sucesso.")
         if LUNA_VIDEO_AFTER_TEXT:
             await send_whatsapp_message(phone=phone, content=LUNA_VIDEO_AFTER_TEXT, type_="text")
             session.add(Message(user_id=user.id, sender="assistant", content=LUNA_VIDEO_AFTER_TEXT, media_type="text"))
             await session.commit()
     except Exception as exc:
-        print(f"[video] falha ao enviar vídeo nativo: {exc!r} — enviando link em texto.")
+        logger.warning("[video] falha ao enviar vídeo nativo: %r — enviando link em texto.", exc)
         fallback_text = (LUNA_VIDEO_CAPTION + "\n" if LUNA_VIDEO_CAPTION else "") + f"{LUNA_VIDEO_URL}"
         try:
             await send_whatsapp_message(phone=phone, content=fallback_text, type_="text")
         except Exception as e2:
-            print(f"[video] fallback textual também falhou: {e2!r}")
+            logger.warning("[video] fallback textual também falhou: %r", e2)
         session.add(Message(user_id=user.id, sender="assistant", content=fallback_text, media_type="text"))
         await session.commit()
         if LUNA_VIDEO_AFTER_TEXT:
@@ -793,7 +792,7 @@ async def get_verify(
 
 async def _process_message_async(phone: str, msg_type: str, text: Optional[str], push_name: Optional[str]) -> None:
     """Processa a mensagem fora do ciclo do request (ou síncrono no modo debug)."""
-    print(f"[bg] start phone=+{phone} type={msg_type} text={repr(text)[:120]}")
+    logger.info("[bg] start phone=+%s type=%s text=%.120r", phone, msg_type, text)
     async with _get_user_lock(phone):
         try:
             async with SessionLocal() as session:
@@ -827,14 +826,14 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
                         try:
                             await send_whatsapp_message(phone=phone, content=end_text, type_="text")
                         except Exception as e:
-                            print(f"[uazapi] send end_text failed (bg): {e!r}")
+                            logger.warning("[uazapi] send end_text failed (bg): %r", e)
                         session.add(Message(user_id=user.id, sender="assistant", content=end_text, media_type="text"))
                         await session.commit()
-                        print("[bg] end after NO (menu).")
+                        logger.info("[bg] end after NO (menu).")
                         return
                     if _is_positive_reply(text) and not video_recent:
                         await _enviar_video(session, phone, user)
-                        print("[bg] video sent after YES (menu).")
+                        logger.info("[bg] video sent after YES (menu).")
                         return
 
                 # 4) Coleta de nome pendente
@@ -857,7 +856,7 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
                     await session.commit()
                     if cand:
                         await _notify_consultants(session, user=user, phone=phone, user_text=text)
-                    print("[bg] handled name_request.")
+                    logger.info("[bg] handled name_request.")
                     return
 
                 # 5) Auto-extrai nome se a Luna pediu há pouco
@@ -880,7 +879,7 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
                                 pass
                             session.add(Message(user_id=user.id, sender="assistant", content=ASK_NAME_TEMPLATE, media_type="name_request"))
                             await session.commit()
-                            print("[bg] asked name before handoff.")
+                            logger.info("[bg] asked name before handoff.")
                             return
                         try:
                             ack = HANDOFF_CONFIRM_TEMPLATE.format(consultor=HANDOFF_CONSULTOR_NAME)
@@ -889,11 +888,11 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
                         try:
                             await send_whatsapp_message(phone=phone, content=ack, type_="text")
                         except Exception as e:
-                            print(f"[handoff] falha ao enviar confirmação: {e!r}")
+                            logger.warning("[handoff] falha ao enviar confirmação: %r", e)
                         session.add(Message(user_id=user.id, sender="assistant", content=ack, media_type="text"))
                         await session.commit()
                         await _notify_consultants(session, user=user, phone=phone, user_text=text)
-                        print("[bg] handoff NOW notified.")
+                        logger.info("[bg] handoff NOW notified.")
                         return
                     if _wants_later(text):
                         msg = HANDOFF_LATER_TEMPLATE.format(consultor=HANDOFF_CONSULTOR_NAME)
@@ -903,7 +902,7 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
                             pass
                         session.add(Message(user_id=user.id, sender="assistant", content=msg, media_type="text"))
                         await session.commit()
-                        print("[bg] handoff LATER acknowledged.")
+                        logger.info("[bg] handoff LATER acknowledged.")
                         return
 
                 # 7) Texto → IA (com timeout + fallback)
@@ -938,10 +937,10 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
                         reply_text = reply_text or ""
                     except asyncio.TimeoutError:
                         ai_failed = True
-                        print(f"[ai] timeout após {LUNA_AI_TIMEOUT}s (thread={thread_id}).")
+                        logger.warning("[ai] timeout após %ss (thread=%s).", LUNA_AI_TIMEOUT, thread_id)
                     except Exception as e:
                         ai_failed = True
-                        print(f"[ai] erro ask_assistant: {e!r}\n{traceback.format_exc()}")
+                        logger.exception("[ai] erro ask_assistant: %r", e)
 
                     raw_reply_for_tools = reply_text
 
@@ -952,22 +951,22 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
 
                     if (wants_menu or _looks_like_invite(raw_reply_for_tools)) and not menu_recent:
                         await _enviar_menu(session, phone, user)
-                        print("[bg] menu enviado por hint da IA.")
+                        logger.info("[bg] menu enviado por hint da IA.")
                         return
                     if wants_video and not video_recent:
                         await _enviar_video(session, phone, user)
-                        print("[bg] vídeo enviado por hint da IA.")
+                        logger.info("[bg] vídeo enviado por hint da IA.")
                         return
                     if (wants_handoff or user_formato) and not (handoff_recent or handoff_offer_recent):
                         await _send_handoff_offer(session, phone=phone, user=user, formato=user_formato)
-                        print("[bg] handoff_offer enviado.")
+                        logger.info("[bg] handoff_offer enviado.")
                         return
                     if not LUNA_STRICT_ASSISTANT and _is_positive_reply(text) and menu_recent and not video_recent:
                         await _enviar_video(session, phone, user)
-                        print("[bg] vídeo fallback após SIM (menu).")
+                        logger.info("[bg] vídeo fallback após SIM (menu).")
                         return
                     if menu_recent and _looks_like_invite(raw_reply_for_tools):
-                        print("[guard] convite duplicado suprimido (menu recente).")
+                        logger.info("[guard] convite duplicado suprimido (menu recente).")
                         return
 
                     # Fallback se a IA falhou ou respondeu vazio
@@ -982,10 +981,10 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
                     try:
                         await send_whatsapp_message(phone=phone, content=clean_text, type_="text")
                     except Exception as e:
-                        print(f"[uazapi] send failed (bg): {e!r}")
+                        logger.warning("[uazapi] send failed (bg): %r", e)
                     session.add(Message(user_id=user.id, sender="assistant", content=clean_text, media_type="text"))
                     await session.commit()
-                    print("[bg] text reply enviado.")
+                    logger.info("[bg] text reply enviado.")
                     return
 
                 # 8) Mensagens não-texto → ACK
@@ -993,13 +992,13 @@ async def _process_message_async(phone: str, msg_type: str, text: Optional[str],
                 try:
                     await send_whatsapp_message(phone=phone, content=ack, type_="text")
                 except Exception as e:
-                    print(f"[uazapi] send failed (bg): {e!r}")
+                    logger.warning("[uazapi] send failed (bg): %r", e)
                 session.add(Message(user_id=user.id, sender="assistant", content=ack, media_type="text"))
                 await session.commit()
-                print("[bg] non-text ACK enviado.")
+                logger.info("[bg] non-text ACK enviado.")
 
         except Exception as exc:
-            print(f"[bg] unexpected error: {exc!r}\n{traceback.format_exc()}")
+            logger.exception("[bg] unexpected error: %r", exc)
 
 # --------------------------- webhook ---------------------------
 @router.post("")
@@ -1024,10 +1023,10 @@ async def webhook_post(
     msg_type = info.get("msg_type") or "unknown"
     text = info.get("text")
 
-    print(f"[webhook] extracted phone={phone} type={msg_type} text_len={(len(text) if text else 0)}")
+    logger.info("[webhook] extracted phone=%s type=%s text_len=%s", phone, msg_type, len(text) if text else 0)
 
     if not phone:
-        print(f"[webhook] no phone extracted; sample={str(payload)[:400]}")
+        logger.warning("[webhook] no phone extracted; sample=%.400s", payload)
         return JSONResponse({"received": True, "note": "no phone"}, status_code=200)
 
     push_name = _deep_get(payload, "data.data.messages.0.pushName") or _deep_get(payload, "messages.0.pushName")
@@ -1048,7 +1047,7 @@ async def webhook_post(
 
     # DEDUP INBOUND
     if await _is_probably_duplicate(db, user.id, text if msg_type == "text" else None, msg_type, window_seconds=5):
-        print("[dedup] inbound duplicado detectado; ignorando processamento.")
+        logger.info("[dedup] inbound duplicado detectado; ignorando processamento.")
         return JSONResponse({"received": True, "note": "duplicate_dropped"}, status_code=200)
 
     # Persist inbound
@@ -1064,7 +1063,7 @@ async def webhook_post(
 
     # Dispara processamento
     if LUNA_DEBUG_FORCE_SYNC:
-        print("[debug] LUNA_DEBUG_FORCE_SYNC=TRUE → executando processamento síncrono.")
+        logger.debug("LUNA_DEBUG_FORCE_SYNC=TRUE → executando processamento síncrono.")
         await _process_message_async(phone=phone, msg_type=msg_type, text=text, push_name=push_name)
     else:
         asyncio.create_task(_process_message_async(phone=phone, msg_type=msg_type, text=text, push_name=push_name))
@@ -1095,7 +1094,7 @@ async def _is_probably_duplicate(db: AsyncSession, user_id: int, text: Optional[
         recent = (now - last_at) <= timedelta(seconds=window_seconds)
         return bool(same_text and same_type and recent)
     except Exception as exc:
-        print(f"[dedup] erro na checagem de duplicidade: {exc!r}")
+        logger.warning("[dedup] erro na checagem de duplicidade: %r", exc)
         return False
 
 def get_router() -> APIRouter:
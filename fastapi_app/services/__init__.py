@@ -5,6 +5,8 @@ Service layer exports.
 from .uazapi_service import (
     send_whatsapp_message,
     send_message,
+    send_bulk,
+    send_broadcast,
     send_menu_interesse,
     upload_file_to_baserow,
 )  # noqa: F401
@@ -13,6 +15,8 @@ from .openai_service import get_or_create_thread, ask_assistant  # noqa: F401
 __all__ = [
     "send_whatsapp_message",
     "send_message",
+    "send_bulk",
+    "send_broadcast",
     "send_menu_interesse",
     "upload_file_to_baserow",
     "get_or_create_thread",
@@ -0,0 +1,83 @@
+# fastapi_app/services/http_clients.py
+"""
+Clientes httpx.AsyncClient compartilhados pelo processo (um por destino).
+
+Cada serviço pede o seu client por nome (ex.: "uazapi", "baserow", "download");
+ele é criado na primeira chamada, reaproveitado por todas as requisições seguintes
+(pool de conexões + handshake TLS/HTTP2 uma vez só) e fechado no shutdown da app.
+
+Expõe:
+- H2_AVAILABLE                         # pacote 'h2' instalado (HTTP/2 possível)
+- get_client(name, base_url, ...) -> httpx.AsyncClient
+- note_http_version(tag, resp)         # loga uma vez o protocolo negociado
+- aclose_clients()                     # chamar no shutdown
+
+ENVs aceitos (pool, valem p/ todos os clients):
+- UAZAPI_MAX_CONNECTIONS  (padrão 100)
+- UAZAPI_MAX_KEEPALIVE    (padrão 50)
+- UAZAPI_KEEPALIVE_EXPIRY (padrão 60s)
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Dict, Mapping, Optional, Set
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (extra httpx[http2])
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+# keepalive_expiry mantém sockets ociosos vivos entre rajadas de envios.
+HTTP_LIMITS = httpx.Limits(
+    max_keepalive_connections=int(os.getenv("UAZAPI_MAX_KEEPALIVE", "50")),
+    max_connections=int(os.getenv("UAZAPI_MAX_CONNECTIONS", "100")),
+    keepalive_expiry=float(os.getenv("UAZAPI_KEEPALIVE_EXPIRY", "60")),
+)
+
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+
+# Tags cujo protocolo negociado já foi logado.
+_HTTP_VERSION_SEEN: Set[str] = set()
+
+
+def get_client(
+    name: str,
+    base_url: str = "",
+    *,
+    timeout: httpx.Timeout,
+    http2: bool = False,
+    headers: Optional[Mapping[str, str]] = None,
+) -> httpx.AsyncClient:
+    """Client compartilhado 'name'; os demais argumentos só valem na criação."""
+    client = _CLIENTS.get(name)
+    if client is None or client.is_closed:
+        client = _CLIENTS[name] = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=HTTP_LIMITS,
+            http2=http2 and H2_AVAILABLE,
+        )
+    return client
+
+
+def note_http_version(tag: str, resp: httpx.Response) -> None:
+    """Loga (uma vez por destino) a versão HTTP realmente negociada, p/ conferir o HTTP/2."""
+    if tag not in _HTTP_VERSION_SEEN:
+        _HTTP_VERSION_SEEN.add(tag)
+        logger.info("[%s] protocolo negociado: %s", tag, resp.http_version)
+
+
+async def aclose_clients() -> None:
+    """Fecha todos os clients compartilhados (chamar no shutdown da aplicação)."""
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for client in clients:
+        await client.aclose()
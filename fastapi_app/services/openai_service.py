@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 import asyncio
+import logging
 from typing import Any, Dict, Optional, Tuple, List
 
 import httpx
@@ -10,6 +11,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models.db_models import User
 
+logger = logging.getLogger(__name__)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 ASSISTANT_ID = os.getenv("ASSISTANT_ID", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")  # usado no fallback de chat
@@ -118,7 +121,7 @@ async def ask_assistant(thread_id: str, text: str, *, max_wait_seconds: int = 18
             )
             r.raise_for_status()
         except Exception as exc:
-            print(f"[openai] add message failed: {exc!r}; falling back to chat.")
+            logger.warning("[openai] add message failed: %r; falling back to chat.", exc)
             return await _chat_fallback(text)
 
         # 2) Cria Run
@@ -130,7 +133,7 @@ async def ask_assistant(thread_id: str, text: str, *, max_wait_seconds: int = 18
             )
             r.raise_for_status()
         except Exception as exc:
-            print(f"[openai] run create failed: {exc!r}; falling back to chat.")
+            logger.warning("[openai] run create failed: %r; falling back to chat.", exc)
             return await _chat_fallback(text)
 
         run = r.json()
@@ -148,7 +151,7 @@ async def ask_assistant(thread_id: str, text: str, *, max_wait_seconds: int = 18
                 r.raise_for_status()
                 cur = r.json()
             except Exception as exc:
-                print(f"[openai] retrieve run error: {exc!r}")
+                logger.warning("[openai] retrieve run error: %r", exc)
                 await asyncio.sleep(step)
                 slept += step
                 continue
@@ -160,7 +163,7 @@ async def ask_assistant(thread_id: str, text: str, *, max_wait_seconds: int = 18
                 required = (cur.get("required_action") or {}).get("submit_tool_outputs", {})
                 await _submit_dummy_tool_outputs(client, thread_id, run_id, required)
             elif status in {"failed", "cancelled", "expired"}:
-                print(f"[openai] run finished with status={status}")
+                logger.info("[openai] run finished with status=%s", status)
                 break
 
             await asyncio.sleep(step)
@@ -198,5 +201,5 @@ async def _chat_fallback(text: str) -> str:
             data = r.json()
             return (data["choices"][0]["message"]["content"] or "").strip() or "Certo!"
     except Exception as exc:
-        print(f"[openai] chat fallback failed: {exc!r}")
+        logger.warning("[openai] chat fallback failed: %r", exc)
         return "Certo!"
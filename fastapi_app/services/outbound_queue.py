@@ -0,0 +1,162 @@
+# fastapi_app/services/outbound_queue.py
+"""
+Fila persistente (SQLite local) para envios que falharam em todas as rotas da UAZAPI.
+
+Quando UAZAPI_OUTBOUND_QUEUE_PATH está definido, um envio que esgota endpoints/formatos
+é gravado aqui em vez de levantar RuntimeError, e um worker em background reenvia com
+backoff exponencial. Sem a variável, a fila fica desligada (comportamento original).
+
+Expõe:
+- enabled() -> bool
+- enqueue(fn, kwargs) -> int            # id da linha
+- start_worker(dispatch) / stop_worker()
+
+ENVs aceitos:
+- UAZAPI_OUTBOUND_QUEUE_PATH   (ex.: /data/outbound.sqlite3; vazio = desligado)
+- UAZAPI_OUTBOUND_MAX_ATTEMPTS (padrão 10; depois disso a linha fica como 'dead')
+- UAZAPI_OUTBOUND_POLL_SECONDS (padrão 5)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+QUEUE_PATH = (os.getenv("UAZAPI_OUTBOUND_QUEUE_PATH", "") or "").strip()
+MAX_ATTEMPTS = int(os.getenv("UAZAPI_OUTBOUND_MAX_ATTEMPTS", "10"))
+POLL_SECONDS = float(os.getenv("UAZAPI_OUTBOUND_POLL_SECONDS", "5"))
+
+# Backoff entre reenvios: min(_BACKOFF_CAP, _BACKOFF_BASE * 2**tentativas) segundos
+_BACKOFF_BASE = 5.0
+_BACKOFF_CAP = 900.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbound (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    fn              TEXT    NOT NULL,
+    kwargs          TEXT    NOT NULL,
+    status          TEXT    NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL    NOT NULL,
+    last_error      TEXT,
+    created_at      REAL    NOT NULL
+)
+"""
+
+Dispatch = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+_worker_task: Optional["asyncio.Task[None]"] = None
+
+
+def enabled() -> bool:
+    return bool(QUEUE_PATH)
+
+
+# ------------------------------------------------------------------
+# Acesso ao SQLite (síncrono; sempre chamado via asyncio.to_thread).
+# Uma conexão por operação: o sqlite3 não deve ser compartilhado entre threads.
+# ------------------------------------------------------------------
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(QUEUE_PATH)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def _insert(fn: str, kwargs: Dict[str, Any]) -> int:
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        cur = conn.execute(
+            "INSERT INTO outbound (fn, kwargs, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+            (fn, orjson.dumps(kwargs).decode(), now, now),
+        )
+        return int(cur.lastrowid)
+
+
+def _due(limit: int = 20) -> List[Tuple[int, str, str, int]]:
+    with closing(_connect()) as conn, conn:
+        rows = conn.execute(
+            "SELECT id, fn, kwargs, attempts FROM outbound "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (time.time(), limit),
+        ).fetchall()
+    return [(int(r[0]), r[1], r[2], int(r[3])) for r in rows]
+
+
+def _delete(row_id: int) -> None:
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM outbound WHERE id = ?", (row_id,))
+
+
+def _reschedule(row_id: int, attempts: int, error: str) -> None:
+    status = "dead" if attempts >= MAX_ATTEMPTS else "pending"
+    delay = min(_BACKOFF_CAP, _BACKOFF_BASE * (2 ** attempts))
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "UPDATE outbound SET attempts = ?, status = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            (attempts, status, time.time() + delay, error[:500], row_id),
+        )
+
+
+# ------------------------------------------------------------------
+# API assíncrona
+# ------------------------------------------------------------------
+async def enqueue(fn: str, kwargs: Dict[str, Any]) -> int:
+    """Grava um envio pendente; 'fn' é o nome da função de envio a ser repetida."""
+    return await asyncio.to_thread(_insert, fn, kwargs)
+
+
+async def _drain_once(dispatch: Dispatch) -> None:
+    for row_id, fn, raw_kwargs, attempts in await asyncio.to_thread(_due):
+        try:
+            await dispatch(fn, orjson.loads(raw_kwargs))
+        except Exception as exc:
+            attempts += 1
+            await asyncio.to_thread(_reschedule, row_id, attempts, repr(exc))
+            if attempts >= MAX_ATTEMPTS:
+                logger.error("[queue] envio %s descartado após %s tentativas: %r", row_id, attempts, exc)
+            else:
+                logger.warning("[queue] reenvio %s falhou (tentativa %s): %r", row_id, attempts, exc)
+            continue
+        await asyncio.to_thread(_delete, row_id)
+        logger.info("[queue] envio %s entregue na tentativa %s", row_id, attempts + 1)
+
+
+async def _worker(dispatch: Dispatch) -> None:
+    while True:
+        try:
+            await _drain_once(dispatch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("[queue] erro no worker: %r", exc)
+        await asyncio.sleep(POLL_SECONDS)
+
+
+def start_worker(dispatch: Dispatch) -> None:
+    """Inicia o worker de reenvio (idempotente). No-op se a fila estiver desligada."""
+    global _worker_task
+    if not enabled() or (_worker_task is not None and not _worker_task.done()):
+        return
+    _worker_task = asyncio.create_task(_worker(dispatch))
+    logger.info("[queue] worker de reenvio iniciado (%s)", QUEUE_PATH)
+
+
+async def stop_worker() -> None:
+    global _worker_task
+    if _worker_task is None:
+        return
+    _worker_task.cancel()
+    try:
+        await _worker_task
+    except asyncio.CancelledError:
+        pass
+    _worker_task = None
@@ -6,20 +6,49 @@ Expõe:
 - send_whatsapp_message(phone, content, type_="text", media_url=None, mime_type=None, caption=None)
 - send_menu_interesse(phone, text, yes_label, no_label, footer_text=None)
 - send_message(...) -> alias compatível (usa send_whatsapp_message)
+- send_bulk(items, max_concurrency=20, mps=50, burst=None, **common) -> envio para vários destinatários em paralelo (limitado)
+- send_broadcast(phones, content, concurrency=20, mps=50) -> [(phone, resultado | exceção)]
 - upload_file_to_baserow(source) -> Optional[dict]   # envia arquivo (URL) p/ Baserow ou resolve metadados por ID
 - normalize_number(phone)
+- reset_route_cache(kind=None) -> descarta rotas aprendidas (ops; força nova sondagem)
+- refresh_headers(token=None) -> remonta os headers de auth (rotação de token)
+- start_outbound_queue() / warmup() -> startup (clients HTTP: ver http_clients.aclose_clients)
 
 Notas:
 - Para enviar VÍDEO como mídia no WhatsApp, use type_="video" e forneça media_url .mp4 público.
+- A primeira combinação (endpoint, formato de payload) aceita pela instância é memorizada
+  por tipo de envio e tentada primeiro nas chamadas seguintes (ver _LEARNED).
+- Com UAZAPI_OUTBOUND_QUEUE_PATH definido, envios que esgotam todas as rotas são gravados
+  na fila persistente (outbound_queue) e retornam {"status": "queued"} em vez de levantar.
 """
 
 from __future__ import annotations
 
+import asyncio
+import binascii
+import contextvars
+import hashlib
+import io
+import itertools
+import logging
+import mimetypes
 import os
-import json
-from typing import Any, Dict, Iterable, Optional, List, Tuple
+import random
+import re
+import tempfile
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
+from types import MappingProxyType
+from urllib.parse import unquote, unquote_to_bytes, urlsplit
+from typing import IO, Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, Mapping, Optional, List, Sequence, Tuple, Union
 
 import httpx
+import orjson
+
+from .http_clients import H2_AVAILABLE, aclose_clients, get_client, note_http_version  # noqa: F401
 
 
 # =====================================================================
@@ -32,11 +61,89 @@ UAZAPI_TOKEN = os.getenv("UAZAPI_TOKEN", "")
 # Nome do header de auth na sua instância (ex.: "token", "apikey", "authorization", "authorization_bearer")
 UAZAPI_AUTH_HEADER_NAME = os.getenv("UAZAPI_AUTH_HEADER_NAME", "token").lower()
 
-# Timeout (s)
+# Timeout (s) de leitura/escrita por requisição; conexão e espera por slot do pool têm
+# tetos próprios, curtos, p/ um host fora do ar ou pool saturado falhar rápido.
 UAZAPI_TIMEOUT = float(os.getenv("UAZAPI_TIMEOUT", "60"))
-
-# Debug verboso no console
-UAZAPI_DEBUG = os.getenv("UAZAPI_DEBUG", "true").strip().lower() in {"1", "true", "yes", "y", "on"}
+UAZAPI_CONNECT_TIMEOUT = float(os.getenv("UAZAPI_CONNECT_TIMEOUT", "5"))
+UAZAPI_POOL_TIMEOUT = float(os.getenv("UAZAPI_POOL_TIMEOUT", "5"))
+
+# Debug verboso (nível DEBUG no logger deste módulo); desligado, os traces de sucesso
+# (guardados por isEnabledFor) nem decodificam o body da resposta
+UAZAPI_DEBUG = os.getenv("UAZAPI_DEBUG", "false").strip().lower() in {"1", "true", "yes", "y", "on"}
+
+logger = logging.getLogger(__name__)
+if UAZAPI_DEBUG:
+    logger.setLevel(logging.DEBUG)
+
+# HTTP/2 (multiplexa requisições concorrentes numa só conexão TLS; requer 'h2')
+UAZAPI_HTTP2 = os.getenv("UAZAPI_HTTP2", "true").strip().lower() in {"1", "true", "yes", "y", "on"}
+
+if UAZAPI_HTTP2 and not H2_AVAILABLE:
+    # Sem o pacote 'h2' o httpx levanta ImportError ao criar o client: cai p/ HTTP/1.1.
+    logger.warning("UAZAPI_HTTP2 ligado mas o pacote 'h2' não está instalado; usando HTTP/1.1")
+    UAZAPI_HTTP2 = False
+
+# Descoberta de rota: quantos endpoints sondar em paralelo enquanto nenhuma rota foi
+# aprendida. 1 = sequencial (padrão). Cada endpoint percorre seus formatos em série.
+UAZAPI_PROBE_CONCURRENCY = max(1, int(os.getenv("UAZAPI_PROBE_CONCURRENCY", "1")))
+
+# Rota aprendida expira após N segundos e a descoberta completa roda de novo (detecta
+# upgrade da instância, que pode passar a aceitar um endpoint preferido). 0 = nunca expira.
+UAZAPI_ROUTE_TTL = float(os.getenv("UAZAPI_ROUTE_TTL", "1800"))
+
+# Codificações de corpo tentadas p/ texto e menu: "auto" (json, form e params, nessa
+# ordem) ou uma lista, ex.: "json" ou "json,form". A maioria das distros só aceita JSON.
+_ALL_TRANSPORTS = ("json", "form", "params")
+UAZAPI_TRANSPORT = os.getenv("UAZAPI_TRANSPORT", "auto").strip().lower()
+_TRANSPORTS = tuple(t for t in _ALL_TRANSPORTS if UAZAPI_TRANSPORT == "auto" or t in UAZAPI_TRANSPORT.split(","))
+if not _TRANSPORTS:
+    logger.warning("UAZAPI_TRANSPORT=%r inválido; usando auto", UAZAPI_TRANSPORT)
+    _TRANSPORTS = _ALL_TRANSPORTS
+
+# Antes da descoberta, um OPTIONS por endpoint candidato descarta os que não existem (404)
+# ou não aceitam POST (header Allow), sem enviar corpo. Opt-in: nem toda distro responde
+# OPTIONS de forma confiável.
+UAZAPI_OPTIONS_PROBE = os.getenv("UAZAPI_OPTIONS_PROBE", "false").strip().lower() in {"1", "true", "yes", "y", "on"}
+
+# Rotas fixas por tipo, dispensando a descoberta no 1º envio de cada processo.
+# Formato: "kind=endpoint shape;..." com os valores logados ao aprender uma rota, ex.:
+#   text=/send/text json:number/text;menu=/send/menu json:canonical
+# Uma rota fixa recusada (4xx) cai na descoberta normal, como a aprendida.
+UAZAPI_PINNED_ROUTES = os.getenv("UAZAPI_PINNED_ROUTES", "")
+
+# GET feito por warmup() no startup p/ abrir a conexão (TCP/TLS/HTTP2) antes do 1º envio;
+# qualquer status serve. Vazio = sem aquecimento.
+UAZAPI_WARMUP_PATH = os.getenv("UAZAPI_WARMUP_PATH", "/instance/status")
+
+# Prazo total de um envio (todas as rotas/formatos/retentativas), em segundos. Cada
+# requisição usa o menor entre UAZAPI_TIMEOUT e o que resta do prazo. 0 = sem prazo.
+UAZAPI_SEND_DEADLINE = float(os.getenv("UAZAPI_SEND_DEADLINE", "120"))
+
+# Disjuntor por endpoint: falhas seguidas (rede/5xx) até abrir e segundos aberto
+# (endpoint pulado sem tocar a rede) antes de liberar uma sonda.
+UAZAPI_BREAKER_FAILS = max(1, int(os.getenv("UAZAPI_BREAKER_FAILS", "5")))
+UAZAPI_BREAKER_RESET = float(os.getenv("UAZAPI_BREAKER_RESET", "30"))
+
+# Segundos em que um envio de mídia bem-sucedido é lembrado (mesmo número + mesma mídia):
+# repetições nesse intervalo devolvem o resultado anterior sem reenviar. 0 = desligado.
+UAZAPI_MEDIA_DEDUP_TTL = float(os.getenv("UAZAPI_MEDIA_DEDUP_TTL", "30"))
+
+# Tamanho máximo de mídia baixada p/ envio/upload (MB); maior que isso é recusado já pelo
+# Content-Length (ou ao passar do limite no streaming). 0 = sem limite.
+UAZAPI_MAX_MEDIA_BYTES = int(float(os.getenv("UAZAPI_MAX_MEDIA_MB", "0")) * 1024 * 1024)
+
+# Teto global de envios/s deste processo (token bucket, rajada de até UAZAPI_RATE_BURST),
+# p/ não estourar o limite do provedor em campanhas. 0 = sem limite.
+UAZAPI_RATE_MPS = float(os.getenv("UAZAPI_RATE_MPS", "0"))
+UAZAPI_RATE_BURST = float(os.getenv("UAZAPI_RATE_BURST") or max(1.0, UAZAPI_RATE_MPS))
+
+# Bulkhead: máximo de envios simultâneos p/ a UAZAPI neste processo (excedentes aguardam
+# em vez de abrir novos sockets). Uploads no Baserow têm um limite próprio, bem menor.
+UAZAPI_MAX_CONCURRENCY = max(1, int(os.getenv("UAZAPI_MAX_CONCURRENCY", "32")))
+BASEROW_MAX_CONCURRENCY = max(1, int(os.getenv("BASEROW_MAX_CONCURRENCY", "4")))
+# Teto de POSTs simultâneos p/ a UAZAPI (um envio pode ter vários no ar durante a sondagem
+# paralela). Padrão: o tamanho do pool, p/ a espera acontecer aqui e não dentro do httpx.
+UAZAPI_MAX_INFLIGHT = max(1, int(os.getenv("UAZAPI_MAX_INFLIGHT") or os.getenv("UAZAPI_MAX_CONNECTIONS") or "100"))
 
 # Rotas (permite override por ENV) + fallbacks comuns em distribuições
 UAZAPI_SEND_TEXT_PATH = os.getenv("UAZAPI_SEND_TEXT_PATH", "/send/text")
@@ -57,152 +164,1230 @@ _MENU_FALLBACKS = [
 
 BASEROW_BASE_URL = os.getenv("BASEROW_BASE_URL", "").rstrip("/")
 BASEROW_API_TOKEN = os.getenv("BASEROW_API_TOKEN", "")
+# Gateways do Baserow self-hosted às vezes só falam HTTP/1.1: toggle separado.
+BASEROW_HTTP2 = H2_AVAILABLE and (
+    os.getenv("BASEROW_HTTP2", os.getenv("UAZAPI_HTTP2", "true")).strip().lower() in {"1", "true", "yes", "y", "on"}
+)
+_BASEROW_HEADERS: Mapping[str, str] = MappingProxyType({"Authorization": f"Token {BASEROW_API_TOKEN}"})
+# Segundos que os metadados de um arquivo (resolvidos por ID) ficam em cache; 0 = sem cache.
+BASEROW_META_TTL = float(os.getenv("BASEROW_META_TTL", "600"))
+
+
+# =====================================================================
+#                       CLIENTE HTTP COMPARTILHADO
+# =====================================================================
+
+# Um AsyncClient por destino (ver http_clients): conexões (e o handshake TLS) são
+# reaproveitadas entre envios. connect curto faz um host fora do ar falhar rápido
+# em vez de segurar o envio.
+_HTTP_TIMEOUT = httpx.Timeout(UAZAPI_TIMEOUT, connect=UAZAPI_CONNECT_TIMEOUT, pool=UAZAPI_POOL_TIMEOUT)
+
+
+def _get_uazapi_client() -> httpx.AsyncClient:
+    return get_client("uazapi", UAZAPI_BASE_URL, timeout=_HTTP_TIMEOUT, http2=UAZAPI_HTTP2)
+
+
+def _get_baserow_client() -> httpx.AsyncClient:
+    # Token do Baserow fixo no client: as requisições não repassam headers=.
+    return get_client(
+        "baserow", BASEROW_BASE_URL, timeout=_HTTP_TIMEOUT, http2=BASEROW_HTTP2, headers=_BASEROW_HEADERS,
+    )
+
+
+def _get_download_client() -> httpx.AsyncClient:
+    # Downloads de mídia (URLs públicas de hosts variados): client sem base_url, mas com pool.
+    return get_client("download", timeout=_HTTP_TIMEOUT, http2=UAZAPI_HTTP2)
+
+
+# Semáforos criados sob demanda, já dentro do event loop da aplicação.
+_uazapi_bulkhead: Optional[asyncio.Semaphore] = None
+_baserow_bulkhead: Optional[asyncio.Semaphore] = None
+_uazapi_inflight: Optional[asyncio.Semaphore] = None
+
+
+def _get_uazapi_bulkhead() -> asyncio.Semaphore:
+    global _uazapi_bulkhead
+    if _uazapi_bulkhead is None:
+        _uazapi_bulkhead = asyncio.Semaphore(UAZAPI_MAX_CONCURRENCY)
+    return _uazapi_bulkhead
+
+
+def _get_uazapi_inflight() -> asyncio.Semaphore:
+    global _uazapi_inflight
+    if _uazapi_inflight is None:
+        _uazapi_inflight = asyncio.Semaphore(UAZAPI_MAX_INFLIGHT)
+    return _uazapi_inflight
+
+
+class _TokenBucket:
+    """Limitador token bucket: no máximo `rate` aquisições/s, com rajada de até `capacity`."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_lock")
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+_rate_limiter: Optional[_TokenBucket] = None
+
+
+async def _rate_limit() -> None:
+    """Aguarda um token do limitador global (no-op com UAZAPI_RATE_MPS=0)."""
+    global _rate_limiter
+    if UAZAPI_RATE_MPS <= 0:
+        return
+    if _rate_limiter is None:
+        _rate_limiter = _TokenBucket(UAZAPI_RATE_MPS, UAZAPI_RATE_BURST)
+    await _rate_limiter.acquire()
+
+
+def _get_baserow_bulkhead() -> asyncio.Semaphore:
+    global _baserow_bulkhead
+    if _baserow_bulkhead is None:
+        _baserow_bulkhead = asyncio.Semaphore(BASEROW_MAX_CONCURRENCY)
+    return _baserow_bulkhead
+
+
+# Um lock por destinatário: envios ao mesmo número saem em ordem, um de cada vez (o
+# WhatsApp não garante a ordem de mensagens concorrentes). Fraco: some sem uso.
+_PHONE_LOCKS: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _phone_lock(digits: str) -> asyncio.Lock:
+    lock = _PHONE_LOCKS.get(digits)
+    if lock is None:
+        lock = _PHONE_LOCKS[digits] = asyncio.Lock()
+    return lock
 
 
 # =====================================================================
 #                                 UTILS
 # =====================================================================
 
-def _dbg(msg: str) -> None:
-    if UAZAPI_DEBUG:
-        print(msg)
+# Achata quebras de linha do trecho de body logado numa única passada.
+_NEWLINE_TRANS = str.maketrans({"\n": " ", "\r": " "})
 
 
-def _headers() -> Dict[str, str]:
-    """Header de autenticação do UAZAPI."""
-    if not UAZAPI_TOKEN:
-        raise RuntimeError("UAZAPI_TOKEN não configurado.")
+def _log_response(tag: str, resp: httpx.Response) -> None:
+    """Loga status + início do body; só os primeiros bytes são decodificados, e só em DEBUG."""
+    if logger.isEnabledFor(logging.DEBUG):
+        preview = resp.content[:300].decode(resp.encoding or "utf-8", "replace")
+        logger.debug("[%s←] %s body=%s", tag, resp.status_code, preview.translate(_NEWLINE_TRANS))
+
+
+def _build_auth_headers(name: str = UAZAPI_AUTH_HEADER_NAME) -> Dict[str, str]:
     # Suporta variantes simples; ajuste se sua instância exigir Bearer.
-    if UAZAPI_AUTH_HEADER_NAME in {"authorization_bearer", "authorization"}:
+    if name in {"authorization_bearer", "authorization"}:
         return {"Authorization": f"Bearer {UAZAPI_TOKEN}"}
-    return {UAZAPI_AUTH_HEADER_NAME: UAZAPI_TOKEN}
+    return {name: UAZAPI_TOKEN}
 
 
-def _ensure_leading_slash(path: str) -> str:
-    return path if path.startswith("/") else f"/{path}"
+def _build_auth_state() -> Tuple[Mapping[str, str], Tuple[Mapping[str, str], ...]]:
+    active = _build_auth_headers()
+    alternatives = tuple(
+        MappingProxyType(_build_auth_headers(name))
+        for name in ("token", "apikey", "authorization_bearer")
+        if _build_auth_headers(name) != active
+    )
+    return MappingProxyType(active), alternatives
 
 
-def _dedup(seq: Iterable[str]) -> List[str]:
-    seen: List[str] = []
-    for item in seq:
-        if item not in seen:
-            seen.append(item)
-    return seen
+# Montado uma vez no import (token/nome do header só mudam via refresh_headers). Imutável:
+# quem precisa de headers extras faz merge numa cópia (ver _post_attempt).
+# Só um header de auth é enviado; se a instância responder 401/403, os esquemas
+# alternativos são testados UMA vez por processo e o aceito passa a ser o ativo.
+_AUTH_HEADERS, _AUTH_ALTERNATIVES = _build_auth_state()
+_AUTH_PROBED = False
 
+# Avisa já no boot (não só no 1º envio); não derruba o import: a app também atende
+# rotas que não usam a UAZAPI.
+if UAZAPI_BASE_URL and not UAZAPI_TOKEN:
+    logger.warning("[uazapi] UAZAPI_TOKEN não configurado; envios vão falhar")
 
-def _text_endpoints() -> List[str]:
-    return _dedup([UAZAPI_SEND_TEXT_PATH, "/send/text"] + _TEXT_FALLBACKS)
 
+def refresh_headers(token: Optional[str] = None) -> None:
+    """
+    Remonta os headers de auth (rotação de token). Sem argumento, relê UAZAPI_TOKEN
+    do ambiente. Libera uma nova sondagem de esquemas em caso de 401/403.
+    """
+    global UAZAPI_TOKEN, _AUTH_HEADERS, _AUTH_ALTERNATIVES, _AUTH_PROBED
+    UAZAPI_TOKEN = os.getenv("UAZAPI_TOKEN", "") if token is None else token
+    _AUTH_HEADERS, _AUTH_ALTERNATIVES = _build_auth_state()
+    _AUTH_PROBED = False
 
-def _media_endpoints() -> List[str]:
-    return _dedup([UAZAPI_SEND_MEDIA_PATH, "/send/media"] + _MEDIA_FALLBACKS)
 
+def _headers() -> Mapping[str, str]:
+    """Header de autenticação do UAZAPI (o esquema ativo)."""
+    if not UAZAPI_TOKEN:
+        raise RuntimeError("UAZAPI_TOKEN não configurado.")
+    return _AUTH_HEADERS
 
-def _menu_endpoints() -> List[str]:
-    return _dedup([UAZAPI_SEND_MENU_PATH] + _MENU_FALLBACKS)
+
+def _ensure_leading_slash(path: str) -> str:
+    return path if path.startswith("/") else f"/{path}"
+
+
+# Endpoints candidatos (só dependem de ENV): calculados uma vez, já com "/" inicial.
+_TEXT_ENDPOINTS: Tuple[str, ...] = tuple(dict.fromkeys(
+    _ensure_leading_slash(e) for e in [UAZAPI_SEND_TEXT_PATH, "/send/text"] + _TEXT_FALLBACKS
+))
+_MEDIA_ENDPOINTS: Tuple[str, ...] = tuple(dict.fromkeys(
+    _ensure_leading_slash(e) for e in [UAZAPI_SEND_MEDIA_PATH, "/send/media"] + _MEDIA_FALLBACKS
+))
+_MENU_ENDPOINTS: Tuple[str, ...] = tuple(dict.fromkeys(
+    _ensure_leading_slash(e) for e in [UAZAPI_SEND_MENU_PATH] + _MENU_FALLBACKS
+))
+
+
+# Extensão (minúscula, sem ponto) -> MIME type
+_MIME_BY_EXT: Dict[str, str] = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "mp4": "video/mp4",
+    "mp3": "audio/mpeg",
+    "ogg": "audio/ogg",
+    "wav": "audio/wav",
+    "m4a": "audio/mp4",
+    "pdf": "application/pdf",
+    "csv": "text/csv",
+}
+
+
+# Inverso de _MIME_BY_EXT (1ª extensão de cada MIME), p/ nomear arquivos de data: URLs.
+_EXT_BY_MIME: Dict[str, str] = {mime: ext for ext, mime in reversed(list(_MIME_BY_EXT.items()))}
+
+# Acima disso (chars), o payload de uma data: URL é decodificado via asyncio.to_thread.
+_INLINE_DECODE_MAX = 64 * 1024
+# data:[<mime>][;param...][;base64],<dados>
+_DATA_URL_RE = re.compile(r"data:([^;,]*)((?:;[^;,]*)*),(.*)", re.IGNORECASE | re.DOTALL)
 
 
 def _infer_mime_from_url(url: str) -> str:
-    """Inferência simples de MIME type a partir da extensão do arquivo na URL."""
-    l = (url or "").lower()
-    if l.endswith(".jpg") or l.endswith(".jpeg"):
-        return "image/jpeg"
-    if l.endswith(".png"):
-        return "image/png"
-    if l.endswith(".gif"):
-        return "image/gif"
-    if l.endswith(".webp"):
-        return "image/webp"
-    if l.endswith(".mp4"):
-        return "video/mp4"
-    if l.endswith(".mp3"):
-        return "audio/mpeg"
-    if l.endswith(".ogg"):
-        return "audio/ogg"
-    if l.endswith(".wav"):
-        return "audio/wav"
-    if l.endswith(".m4a"):
-        return "audio/mp4"
-    if l.endswith(".pdf"):
-        return "application/pdf"
-    if l.endswith(".csv"):
-        return "text/csv"
-    return "application/octet-stream"
-
-
-async def _download_bytes(url: str) -> Tuple[Optional[bytes], Optional[str]]:
-    """
-    Faz download de um arquivo para bytes.
-    Suporta:
-    - data: URLs
-    - http(s) público
-    - ID numérico do Baserow (resolve via upload_file_to_baserow)
-    Retorna (bytes, filename) ou (None, None).
-    """
-    if not url:
+    """
+    Inferência simples de MIME type a partir da extensão do arquivo na URL (ignora ?query
+    e #fragmento). Extensões fora da tabela caem na base do módulo mimetypes.
+    """
+    path = urlsplit(url or "").path
+    ext = os.path.splitext(path)[1].lower()
+    mime = _MIME_BY_EXT.get(ext[1:])
+    if mime is None and ext:
+        mime = mimetypes.guess_type(path)[0]
+    return mime or "application/octet-stream"
+
+
+async def _decode_data_url(url: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Decodifica uma data: URL (ex.: data:video/mp4;base64,...) em (bytes, filename),
+    ou (None, None) se não for uma data: URL válida. Só data: URLs: http(s) vem em
+    streaming por _open_shared_download e IDs do Baserow são resolvidos em _open_media,
+    nunca com o corpo inteiro em memória.
+    """
+    if url[:5].lower() != "data:":
         return None, None
     try:
-        # Suporte a data URLs (ex.: data:video/mp4;base64,...)
-        if url.lower().startswith("data:"):
-            parts = url.split(",", 1)
-            header = parts[0] if len(parts) > 1 else ""
-            data = parts[1] if len(parts) > 1 else ""
-            mime = ""
-            if ";" in header:
-                mime, _enc = header[5:].split(";", 1)
-            if "base64" in header:
-                import base64
-                return base64.b64decode(data), f"file.{(mime.split('/')[-1] or 'bin')}"
-            else:
-                from urllib.parse import unquote_to_bytes
-                return unquote_to_bytes(data), f"file.{(mime.split('/')[-1] or 'bin')}"
-
-        # Se receber um ID numérico de arquivo do Baserow, resolve para URL pública
-        if url.isdigit():
-            up = await upload_file_to_baserow(url)  # retorna metadados ou None
-            if up and isinstance(up, dict) and up.get("url"):
-                url = up["url"]
-            else:
-                return None, None
+        m = _DATA_URL_RE.match(url)
+        if m is None:
+            return None, None
+        mime, params, data = m.groups()
+        mime = mime.strip().lower()
+        filename = f"file.{_EXT_BY_MIME.get(mime) or mime.rpartition('/')[2] or 'bin'}"
+        is_base64 = params.lower().endswith(";base64")
+        # teto do tamanho decodificado, checado antes de decodificar (base64: 3 bytes a
+        # cada 4 chars; percent-encoding: cada char vira no máximo 1 byte)
+        _check_media_size(len(data) * 3 // 4 if is_base64 else len(data))
+        decode = binascii.a2b_base64 if is_base64 else unquote_to_bytes
+        # payloads grandes (ex.: vídeo em base64) decodificam fora do event loop
+        if len(data) > _INLINE_DECODE_MAX:
+            return await asyncio.to_thread(decode, data), filename
+        return decode(data), filename
+    except Exception as exc:
+        logger.warning("Falha ao decodificar data: URL da mídia: %s", exc)
+        return None, None
 
-        async with httpx.AsyncClient(timeout=UAZAPI_TIMEOUT) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            file_bytes = resp.content
 
-            # Tenta extrair filename do Content-Disposition (quando disponível)
-            filename: Optional[str] = None
-            cd = resp.headers.get("content-disposition") or resp.headers.get("Content-Disposition")
-            if cd and "filename=" in cd:
-                try:
-                    # filename="..." ou filename=...
-                    fname = cd.split("filename=", 1)[1].strip().strip('"').strip("'")
-                    # remove path, se vier
-                    filename = fname.split("/")[-1].split("\\")[-1]
-                except Exception:
-                    filename = None
+# Content-Disposition: filename*=UTF-8''nome%20codificado (RFC 5987) tem prioridade
+# sobre filename="..." / filename=...
+_CD_FILENAME_EXT_RE = re.compile(r"filename\*\s*=\s*([\w!#$%&+^`{}~.-]*)'[^']*'([^;\s]+)", re.IGNORECASE)
+_CD_FILENAME_RE = re.compile(r'filename\s*=\s*(?:"([^"]*)"|([^;]+))', re.IGNORECASE)
+
+
+def _filename_from_response(resp: httpx.Response, url: str) -> str:
+    """Filename do Content-Disposition (quando disponível) ou do último segmento da URL."""
+    filename: Optional[str] = None
+    cd = resp.headers.get("content-disposition")
+    if cd:
+        m = _CD_FILENAME_EXT_RE.search(cd)
+        if m:
+            try:
+                filename = unquote(m.group(2), encoding=m.group(1) or "utf-8", errors="replace")
+            except LookupError:  # charset desconhecido
+                filename = unquote(m.group(2), errors="replace")
+        else:
+            m = _CD_FILENAME_RE.search(cd)
+            if m:
+                filename = (m.group(1) if m.group(1) is not None else m.group(2)).strip().strip("'")
+        if filename:
+            # remove path, se vier
+            filename = filename.replace("\\", "/").rsplit("/", 1)[-1]
+    return filename or urlsplit(url).path.rsplit("/", 1)[-1] or "file"
+
+
+# Downloads em streaming: até _SPOOL_MAX_BYTES ficam em memória; acima disso vão
+# para um arquivo temporário em disco (pico de RAM ~ O(chunk), não O(arquivo)).
+# Não usamos tempfile.SpooledTemporaryFile porque o httpx chama fileno() ao montar
+# o multipart, o que força o rollover p/ disco mesmo em arquivos pequenos.
+_SPOOL_MAX_BYTES = 1024 * 1024
+_STREAM_CHUNK = 64 * 1024
+
+
+class _MediaTooLarge(Exception):
+    pass
 
-            if not filename:
-                filename = url.split("/")[-1].split("?")[0] or "file"
 
-            return file_bytes, filename
+def _check_media_size(size: int) -> None:
+    if UAZAPI_MAX_MEDIA_BYTES and size > UAZAPI_MAX_MEDIA_BYTES:
+        raise _MediaTooLarge(f"mídia com {size} bytes excede UAZAPI_MAX_MEDIA_MB")
+
+
+async def _download_to_spool(
+    url: str,
+    spill: Callable[[], IO[bytes]] = tempfile.TemporaryFile,
+) -> Tuple[Optional[IO[bytes]], Optional[str]]:
+    """
+    Baixa uma URL http(s) em streaming para um arquivo binário posicionado no início.
+    Retorna (arquivo, filename) ou (None, None). O chamador deve fechar o arquivo.
+    'spill' cria o arquivo em disco usado acima de _SPOOL_MAX_BYTES.
+    """
+    buf: IO[bytes] = io.BytesIO()
+    try:
+        async with _get_download_client().stream("GET", url) as resp:
+            resp.raise_for_status()
+            # Content-Length já acima do limite: grava direto em disco, sem passar
+            # pelo buffer em memória (e sem a cópia no momento do rollover).
+            size = resp.headers.get("Content-Length", "")
+            if size.isdigit():
+                _check_media_size(int(size))
+                if int(size) > _SPOOL_MAX_BYTES:
+                    buf = spill()
+            async for chunk in resp.aiter_bytes(_STREAM_CHUNK):
+                buf.write(chunk)
+                _check_media_size(buf.tell())
+                if isinstance(buf, io.BytesIO) and buf.tell() > _SPOOL_MAX_BYTES:
+                    disk = spill()
+                    disk.write(buf.getbuffer())
+                    buf = disk
+            filename = _filename_from_response(resp, url)
+        if not buf.tell():
+            buf.close()
+            return None, None
+        buf.seek(0)
+        return buf, filename
     except Exception as exc:
-        print(f"Falha no download da mídia: {exc}")
+        buf.close()
+        logger.warning("Falha no download da mídia: %s", exc)
         return None, None
 
 
+async def _open_media(url: str) -> Tuple[Optional[IO[bytes]], Optional[str]]:
+    """
+    Abre a mídia como arquivo binário (o chamador fecha). IDs do Baserow viram a URL
+    pública; http(s) vem em streaming (_download_to_spool); data: URLs são decodificadas
+    por _decode_data_url. Respeita UAZAPI_MAX_MEDIA_MB.
+    """
+    if url.isdigit():
+        up = await upload_file_to_baserow(url)
+        url = up.get("url") if isinstance(up, dict) else None
+        if not url:
+            return None, None
+    if url[:8].lower().startswith(("http://", "https://")):
+        return await _open_shared_download(url)
+    data, filename = await _decode_data_url(url)
+    return (io.BytesIO(data), filename) if data else (None, None)
+
+
+class _SharedDownload:
+    """
+    Um download http(s) compartilhado por todos que pedem a mesma URL ao mesmo tempo
+    (ex.: broadcast da mesma mídia). Pequeno: bytes em memória. Grande: arquivo temporário
+    nomeado, que cada chamador reabre com o próprio descritor; o último a abrir o fecha
+    (e o arquivo some do disco, ficando vivo só pelos descritores abertos).
+    """
+
+    __slots__ = ("task", "waiters", "released")
+
+    def __init__(self, task: "asyncio.Task[Optional[Tuple[Any, str]]]") -> None:
+        self.task = task
+        self.waiters = 0
+        self.released = False
+
+    def release(self) -> None:
+        """Fecha o arquivo do download quando não há mais quem vá reabri-lo (idempotente)."""
+        if self.released or self.waiters or not self.task.done():
+            return
+        self.released = True
+        if not self.task.cancelled() and self.task.exception() is None:
+            result = self.task.result()
+            if result is not None and not isinstance(result[0], bytes):
+                result[0].close()
+
+
+# URL -> download em andamento (ver _SharedDownload)
+_INFLIGHT_DOWNLOADS: Dict[str, _SharedDownload] = {}
+
+
+async def _shared_download(url: str) -> Optional[Tuple[Any, str]]:
+    """(bytes | arquivo temporário nomeado, filename) ou None se o download falhou."""
+    buf, filename = await _download_to_spool(url, spill=tempfile.NamedTemporaryFile)
+    if buf is None:
+        return None
+    if isinstance(buf, io.BytesIO):
+        return buf.getvalue(), filename or "file"
+    return buf, filename or "file"
+
+
+async def _open_shared_download(url: str) -> Tuple[Optional[IO[bytes]], Optional[str]]:
+    shared = _INFLIGHT_DOWNLOADS.get(url)
+    if shared is None:
+        shared = _INFLIGHT_DOWNLOADS[url] = _SharedDownload(asyncio.ensure_future(_shared_download(url)))
+
+        def _done(t: "asyncio.Task[Any]", shared: _SharedDownload = shared) -> None:
+            if _INFLIGHT_DOWNLOADS.get(url) is shared:
+                del _INFLIGHT_DOWNLOADS[url]
+            shared.release()  # todos os interessados desistiram antes do fim
+
+        shared.task.add_done_callback(_done)
+    shared.waiters += 1
+    try:
+        result = await asyncio.shield(shared.task)
+        if result is None:
+            return None, None
+        data, filename = result
+        if isinstance(data, bytes):
+            return io.BytesIO(data), filename
+        return open(data.name, "rb"), filename
+    finally:
+        # Também se este chamador for cancelado após o fim do download: o último a sair
+        # fecha o arquivo temporário.
+        shared.waiters -= 1
+        shared.release()
+
+
+def _rewind_files(kwargs: Mapping[str, Any]) -> None:
+    """Volta ao início os arquivos do multipart: o mesmo objeto é reusado entre tentativas."""
+    for value in (kwargs.get("files") or {}).values():
+        fileobj = value[1] if isinstance(value, tuple) else value
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+
+
+class _KeepAsciiDigits(dict):
+    """Tabela p/ str.translate: mantém 0-9 e apaga o resto (memoiza cada code point visto)."""
+
+    def __missing__(self, codepoint: int) -> None:
+        self[codepoint] = None
+        return None
+
+
+_DIGITS_TABLE = _KeepAsciiDigits({cp: cp for cp in range(ord("0"), ord("9") + 1)})
+
+
 def _only_digits(s: str) -> str:
-    return "".join(ch for ch in str(s) if ch.isdigit())
+    s = str(s)
+    # Caminho comum: o número já chega normalizado (rotas repassam só dígitos) -> sem cópia.
+    if s.isascii() and s.isdigit():
+        return s
+    return s.translate(_DIGITS_TABLE)
+
+
+@lru_cache(maxsize=4096)
+def _chatid_variants(digits: str) -> Tuple[str, str]:
+    return f"{digits}@c.us", f"{digits}@s.whatsapp.net"
+
+
+@lru_cache(maxsize=4096)
+def _dest_variants(digits: str) -> Dict[str, Dict[str, str]]:
+    """
+    Variações de destino (por nome) aceitas pelas diferentes distros.
+    Memoizado por número (o mesmo lead recebe várias mensagens): o resultado é
+    compartilhado entre chamadas e NÃO deve ser alterado — use {**dests[dn], ...}.
+    """
+    plus_digits = digits if str(digits).startswith("+") else f"+{digits}"
+    c_us, s_net = _chatid_variants(digits)
+    return {
+        "number": {"number": digits}, "number+": {"number": plus_digits},
+        "phone": {"phone": digits},   "phone+": {"phone": plus_digits},
+        "to": {"to": digits},         "to+": {"to": plus_digits},
+        "chatId": {"chatId": c_us},
+        "jid": {"jid": s_net},
+    }
+
+
+# =====================================================================
+#               ROTA APRENDIDA (endpoint + formato de payload)
+# =====================================================================
+
+# Cada tentativa: (endpoint, shape, kwargs p/ client.post). 'shape' identifica o
+# formato do payload independente dos valores (ex.: "json:number/text"). kwargs pode
+# ser uma função sem argumentos que os monta só quando a tentativa é de fato enviada.
+_AttemptKwargs = Union[Dict[str, Any], Callable[[], Dict[str, Any]]]
+_Attempt = Tuple[str, str, _AttemptKwargs]
+
+# (base_url, kind) -> (endpoint, shape, aprendida_em) da combinação que já respondeu < 400;
+# kind: "text" | "video" | "media" | "menu". É tentada primeiro nas próximas chamadas e
+# descartada se voltar a falhar ou após UAZAPI_ROUTE_TTL (re-sondagem periódica).
+_LEARNED: Dict[Tuple[str, str], Tuple[str, str, float]] = {}
+
+
+def _parse_pinned_routes(raw: str) -> Dict[str, Tuple[str, str]]:
+    routes: Dict[str, Tuple[str, str]] = {}
+    for item in raw.split(";"):
+        kind, _, route = item.partition("=")
+        endpoint, _, shape = route.strip().partition(" ")
+        if kind.strip() and endpoint and shape.strip():
+            routes[kind.strip()] = (_ensure_leading_slash(endpoint), shape.strip())
+        elif item.strip():
+            logger.warning("[uazapi] UAZAPI_PINNED_ROUTES: item ignorado %r", item)
+    return routes
+
+
+# kind -> (endpoint, shape) vindos de UAZAPI_PINNED_ROUTES; usados enquanto nada foi aprendido
+_PINNED: Dict[str, Tuple[str, str]] = _parse_pinned_routes(UAZAPI_PINNED_ROUTES)
+
+
+def reset_route_cache(kind: Optional[str] = None) -> None:
+    """Esquece as rotas aprendidas (todas ou só de 'kind'); o próximo envio re-sonda."""
+    for key in [k for k in _LEARNED if kind is None or k[1] == kind]:
+        del _LEARNED[key]
+    logger.info("[uazapi] rotas aprendidas descartadas (%s)", kind or "todas")
+
+
+def _learned_route(kind: str) -> Optional[Tuple[str, str]]:
+    key = (UAZAPI_BASE_URL, kind)
+    hit = _LEARNED.get(key)
+    if hit is None:
+        return _PINNED.get(kind)
+    endpoint, shape, learned_at = hit
+    if UAZAPI_ROUTE_TTL > 0 and time.monotonic() - learned_at > UAZAPI_ROUTE_TTL:
+        logger.debug("[uazapi] rota aprendida p/ %s expirou; re-sondando", kind)
+        _LEARNED.pop(key, None)
+        return None
+    return endpoint, shape
+
+
+# =====================================================================
+#                      PRAZO (deadline) DO ENVIO
+# =====================================================================
+
+# Instante (time.monotonic) até o qual o envio corrente pode tentar; None = sem prazo.
+# ContextVar: cada envio (task) enxerga o seu, sem passar o prazo por todas as funções.
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("uazapi_deadline", default=None)
+
+
+def _remaining() -> Optional[float]:
+    deadline = _DEADLINE.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _deadline_passed() -> bool:
+    remaining = _remaining()
+    return remaining is not None and remaining <= 0
+
+
+# Folga além do prazo antes de cancelar o bloco do envio: o caminho normal (POST com
+# timeout encurtado -> fila de reenvio/erro) termina primeiro quando chega a tempo.
+_DEADLINE_GRACE = 1.0
+
+
+@asynccontextmanager
+async def _deadline_scope(*, start: bool = False) -> AsyncIterator[None]:
+    """
+    Cancela o bloco quando o prazo do envio esgota (RuntimeError). Cobre o que não passa
+    pelo timeout dos POSTs: download da mídia, resolução no Baserow, esperas por
+    lock/bulkhead/limitador de taxa.
+    start=True: inicia o prazo padrão (agora + UAZAPI_SEND_DEADLINE) se o chamador não
+    passou um. Os envios fazem isso já com o lock do número e o bulkhead em mãos: a
+    espera atrás de outro envio ao mesmo número não consome o prazo padrão deste.
+    """
+    if start and _DEADLINE.get() is None and UAZAPI_SEND_DEADLINE > 0:
+        _DEADLINE.set(time.monotonic() + UAZAPI_SEND_DEADLINE)
+    remaining = _remaining()
+    scope = asyncio.timeout(None if remaining is None else max(0.0, remaining) + _DEADLINE_GRACE)
+    try:
+        async with scope:
+            yield
+    except TimeoutError as exc:
+        if not scope.expired():
+            raise
+        raise RuntimeError("UAZAPI: prazo do envio esgotado") from exc
+
+
+def _request_timeout() -> Optional[httpx.Timeout]:
+    """Timeout encurtado p/ o que resta do prazo (None = usa o padrão do client)."""
+    remaining = _remaining()
+    if remaining is None or remaining >= UAZAPI_TIMEOUT:
+        return None
+    remaining = max(0.1, remaining)
+    return httpx.Timeout(
+        remaining,
+        connect=min(UAZAPI_CONNECT_TIMEOUT, remaining),
+        pool=min(UAZAPI_POOL_TIMEOUT, remaining),
+    )
+
+
+# =====================================================================
+#                  DISJUNTOR (circuit breaker) POR ENDPOINT
+# =====================================================================
+
+class CircuitBreaker:
+    """
+    Disjuntor CLOSED -> OPEN -> HALF_OPEN por (base_url, endpoint).
+    Após `fail_threshold` falhas seguidas (exceção de rede ou 5xx) o endpoint é pulado
+    por `reset_timeout` segundos; depois disso uma única sonda é liberada: sucesso fecha
+    o disjuntor, falha o reabre. 4xx não conta (o endpoint respondeu, só recusou o formato),
+    exceto 405 num endpoint que nunca aceitou nada: a rota não existe p/ POST nesta instância.
+    404 fica de fora: há instâncias que respondem 404 a um formato de payload desconhecido.
+    """
+
+    __slots__ = ("fail_threshold", "reset_timeout", "failures", "state", "opened_at", "proven")
+
+    def __init__(
+        self,
+        fail_threshold: int = UAZAPI_BREAKER_FAILS,
+        reset_timeout: float = UAZAPI_BREAKER_RESET,
+    ) -> None:
+        self.fail_threshold = fail_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.proven = False  # já respondeu < 400 alguma vez
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        # OPEN com cooldown vencido -> HALF_OPEN. Uma sonda cancelada (ex.: corrida entre
+        # endpoints) não trava o disjuntor: após outro cooldown libera-se nova sonda.
+        now = time.monotonic()
+        if now - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self, *, proven: bool = False) -> None:
+        self.failures = 0
+        self.state = "closed"
+        if proven:
+            self.proven = True
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.fail_threshold:
+            if self.state != "open":
+                logger.warning("[uazapi] circuito aberto após %s falhas seguidas", self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+_BREAKERS: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+
+def _breaker(endpoint: str) -> CircuitBreaker:
+    key = (UAZAPI_BASE_URL, endpoint)
+    br = _BREAKERS.get(key)
+    if br is None:
+        br = _BREAKERS[key] = CircuitBreaker()
+    return br
+
+
+# Retentativas do MESMO POST só quando a UAZAPI certamente não processou a mensagem:
+# 408/425/429/503 ou falha ao conectar. 500/502/504 e timeout de leitura podem já ter
+# entregue -> não repetimos (evita mensagem duplicada); seguem para o próximo formato.
+_TRANSIENT_STATUS = {408, 425, 429, 503}
+_RETRY_MAX_TRIES = max(1, int(os.getenv("UAZAPI_RETRY_MAX_TRIES", "3")))
+_RETRY_BASE_DELAY = float(os.getenv("UAZAPI_RETRY_BASE_DELAY", "0.2"))
+_RETRY_MAX_DELAY = float(os.getenv("UAZAPI_RETRY_MAX_DELAY", "8"))
+
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """Retry-After em segundos ("5") ou data HTTP ("Wed, 21 Oct 2026 07:28:00 GMT")."""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _retry_delay(attempt: int, resp: Optional[httpx.Response]) -> float:
+    """Backoff exponencial com jitter total; respeita Retry-After se vier."""
+    if resp is not None:
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after:
+            delay = _parse_retry_after(retry_after)
+            if delay is not None:
+                return min(_RETRY_MAX_DELAY, delay)
+    return min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * (2 ** attempt)) * random.random()
+
+
+_AUTH_FAILED = (401, 403)
+_auth_lock: Optional[asyncio.Lock] = None
+
+
+def _get_auth_lock() -> asyncio.Lock:
+    global _auth_lock
+    if _auth_lock is None:
+        _auth_lock = asyncio.Lock()
+    return _auth_lock
+
+
+async def _reauth(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    shape: str,
+    kwargs: Dict[str, Any],
+    auth: Mapping[str, str],
+    resp: httpx.Response,
+) -> httpx.Response:
+    """
+    Trata um 401/403 do POST enviado com o header de auth 'auth'. Se outro envio já
+    trocou o esquema ativo, repete uma vez com ele; senão testa os esquemas alternativos
+    (UMA vez por processo) e o primeiro aceito vira _AUTH_HEADERS. Serializado por lock:
+    envios concorrentes esperam a sondagem em vez de desistirem no meio dela.
+    Devolve a melhor resposta; 401/403 aqui significa auth recusada de vez.
+    """
+    global _AUTH_PROBED, _AUTH_HEADERS
+    async with _get_auth_lock():
+        if _AUTH_HEADERS is not auth:
+            candidates: Tuple[Mapping[str, str], ...] = (_AUTH_HEADERS,)
+        elif not _AUTH_PROBED:
+            _AUTH_PROBED = True
+            candidates = _AUTH_ALTERNATIVES
+        else:
+            return resp
+        base = {k: v for k, v in kwargs["headers"].items() if k not in auth}
+        for alt in candidates:
+            _rewind_files(kwargs)
+            try:
+                async with _get_uazapi_inflight():
+                    alt_resp = await client.post(endpoint, **{**kwargs, "headers": {**base, **alt}})
+            except Exception as exc:
+                logger.warning("[uazapi] exception on %s %s (auth %s): %s", endpoint, shape, next(iter(alt)), exc)
+                continue
+            _log_response("uazapi", alt_resp)
+            if alt_resp.status_code not in _AUTH_FAILED:
+                if alt is not _AUTH_HEADERS:
+                    logger.info(
+                        "[uazapi] auth aceito com header %r (UAZAPI_AUTH_HEADER_NAME=%r recusado)",
+                        next(iter(alt)), UAZAPI_AUTH_HEADER_NAME,
+                    )
+                    _AUTH_HEADERS = alt
+                return alt_resp
+        if candidates is _AUTH_ALTERNATIVES:
+            logger.warning("[uazapi] %s em todos os esquemas de auth; verifique UAZAPI_TOKEN", resp.status_code)
+        return resp
+
+
+async def _backoff(attempt: int, resp: Optional[httpx.Response]) -> bool:
+    """Dorme antes da próxima tentativa; False (sem dormir) se o prazo do envio não comporta."""
+    delay = _retry_delay(attempt, resp)
+    remaining = _remaining()
+    if remaining is not None and delay >= remaining:
+        return False
+    await asyncio.sleep(delay)
+    return True
+
+
+def _ok_response(resp: httpx.Response, *, with_raw: bool = False) -> Dict[str, Any]:
+    try:
+        return orjson.loads(resp.content)
+    except Exception:
+        out: Dict[str, Any] = {"status": "ok", "http_status": resp.status_code}
+        if with_raw:
+            out["raw"] = resp.text
+        return out
+
+
+async def _post_attempt(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    shape: str,
+    kwargs: _AttemptKwargs,
+) -> Optional[httpx.Response]:
+    """
+    Um POST; devolve a resposta (qualquer status) ou None se não houve resposta
+    (exceção de rede, disjuntor aberto ou prazo do envio esgotado; erros são logados).
+    Endpoints com o disjuntor aberto são pulados sem tocar a rede; falhas transitórias
+    (ver _TRANSIENT_STATUS) são repetidas com backoff até _RETRY_MAX_TRIES vezes.
+    O timeout de cada requisição nunca passa do que resta do prazo do envio.
+    O header de auth é lido a cada tentativa (pode ter mudado via _reauth).
+    """
+    if _deadline_passed():
+        logger.debug("[uazapi] prazo do envio esgotado; pulando %s %s", endpoint, shape)
+        return None
+    br = _breaker(endpoint)
+    if not br.allow():
+        logger.debug("[uazapi] circuito aberto em %s; pulando %s", endpoint, shape)
+        return None
+    if callable(kwargs):
+        kwargs = kwargs()
+    auth = _headers()
+    extra = kwargs.get("headers")
+    if extra:
+        kwargs = {**kwargs, "headers": {**auth, **extra}}
+    else:
+        kwargs = {**kwargs, "headers": auth}
+    for attempt in range(_RETRY_MAX_TRIES):
+        last = attempt == _RETRY_MAX_TRIES - 1
+        timeout = _request_timeout()
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        _rewind_files(kwargs)
+        try:
+            logger.debug("[uazapi→] POST %s %s", endpoint, shape)
+            async with _get_uazapi_inflight():
+                resp = await client.post(endpoint, **kwargs)
+            note_http_version("uazapi", resp)
+            _log_response("uazapi", resp)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as exc:
+            if last or not await _backoff(attempt, None):
+                br.record_failure()
+                logger.warning("[uazapi] exception on %s %s: %s", endpoint, shape, exc)
+                return None
+            continue
+        except Exception as exc:
+            br.record_failure()
+            logger.warning("[uazapi] exception on %s %s: %s", endpoint, shape, exc)
+            return None
+        if resp.status_code in _TRANSIENT_STATUS and not last and await _backoff(attempt, resp):
+            continue
+        break
+    if resp.status_code in _AUTH_FAILED:
+        resp = await _reauth(client, endpoint, shape, kwargs, auth, resp)
+    status = resp.status_code
+    if status >= 500 or (status == 405 and not br.proven):
+        br.record_failure()
+    else:
+        br.record_success(proven=status < 400)
+    return resp
+
+
+async def _first_ok(
+    client: httpx.AsyncClient,
+    attempts: Iterable[_Attempt],
+) -> Optional[Tuple[str, str, httpx.Response]]:
+    for endpoint, shape, kwargs in attempts:
+        resp = await _post_attempt(client, endpoint, shape, kwargs)
+        if resp is None:
+            continue
+        if resp.status_code < 400:
+            return endpoint, shape, resp
+        if resp.status_code in _AUTH_FAILED:
+            # Auth recusada mesmo após _reauth: nenhum outro formato/endpoint vai passar.
+            logger.warning("[uazapi] auth recusada (%s) em %s; abandonando o envio", resp.status_code, endpoint)
+            return None
+    return None
+
+
+async def _race_endpoints(
+    client: httpx.AsyncClient,
+    attempts: Iterable[_Attempt],
+) -> Optional[Tuple[str, str, httpx.Response]]:
+    """
+    Sonda até UAZAPI_PROBE_CONCURRENCY endpoints ao mesmo tempo (cada um percorre seus
+    formatos em série) e fica com o primeiro que aceitar; os demais são cancelados.
+    O paralelismo é só entre endpoints: formatos do mesmo endpoint poderiam ser
+    aceitos juntos e entregar a mensagem em duplicidade.
+    """
+    groups: Dict[str, List[_Attempt]] = {}
+    for a in attempts:
+        groups.setdefault(a[0], []).append(a)
+
+    sem = asyncio.Semaphore(UAZAPI_PROBE_CONCURRENCY)
+
+    async def _group(group: List[_Attempt]) -> Optional[Tuple[str, str, httpx.Response]]:
+        async with sem:
+            return await _first_ok(client, group)
+
+    pending = {asyncio.create_task(_group(g)) for g in groups.values()}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            hits = [hit for hit in (task.result() for task in done) if hit is not None]
+            if hits:
+                if len(hits) > 1:
+                    # Dois endpoints aceitaram no mesmo instante: a mensagem pode ter saído 2x.
+                    logger.warning(
+                        "[uazapi] sondagem paralela: %s endpoints aceitaram (%s); possível duplicidade",
+                        len(hits), ", ".join(h[0] for h in hits),
+                    )
+                return hits[0]
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# Tipos nunca sondados em paralelo: o multipart reenviaria o arquivo inteiro por tentativa.
+_SEQUENTIAL_KINDS = {"media"}
+
+
+# (base_url, endpoint) -> aceita POST? (resultado do OPTIONS; ver UAZAPI_OPTIONS_PROBE)
+_ENDPOINT_ACCEPTS_POST: Dict[Tuple[str, str], bool] = {}
+
+
+async def _options_accepts_post(client: httpx.AsyncClient, endpoint: str) -> bool:
+    key = (UAZAPI_BASE_URL, endpoint)
+    known = _ENDPOINT_ACCEPTS_POST.get(key)
+    if known is not None:
+        return known
+    try:
+        resp = await client.options(endpoint, headers=_headers())
+    except Exception as exc:
+        logger.debug("[uazapi] OPTIONS %s falhou: %s", endpoint, exc)
+        return True  # sem resposta não prova nada; não memoriza
+    allow = resp.headers.get("Allow")
+    if resp.status_code == 404:
+        accepts = False
+    elif allow is not None and resp.status_code < 400:
+        accepts = "POST" in allow.upper()
+    else:
+        accepts = True
+    _ENDPOINT_ACCEPTS_POST[key] = accepts
+    if not accepts:
+        logger.info("[uazapi] %s descartado (OPTIONS %s, Allow=%r)", endpoint, resp.status_code, allow)
+    return accepts
+
+
+async def _prune_missing_endpoints(
+    client: httpx.AsyncClient,
+    attempts: List[_Attempt],
+) -> List[_Attempt]:
+    """Remove tentativas de endpoints descartados pelo OPTIONS; se sobrar nada, mantém todas."""
+    endpoints = list(dict.fromkeys(a[0] for a in attempts))
+    verdicts = await asyncio.gather(*(_options_accepts_post(client, ep) for ep in endpoints))
+    alive = {ep for ep, ok in zip(endpoints, verdicts) if ok}
+    pruned = [a for a in attempts if a[0] in alive]
+    return pruned or attempts
+
+
+async def _try_attempts(
+    client: httpx.AsyncClient,
+    kind: str,
+    attempts: Iterable[_Attempt],
+    *,
+    with_raw: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    Executa as tentativas até a primeira resposta < 400 (rota aprendida primeiro).
+    Sem rota aprendida e com UAZAPI_PROBE_CONCURRENCY > 1, sonda endpoints em paralelo.
+    Memoriza a combinação vencedora em _LEARNED; retorna None se todas falharem.
+    'attempts' pode ser um gerador preguiçoso: com rota aprendida, só é consumido
+    (e os payloads serializados) até ela.
+    """
+    learned = _learned_route(kind)
+    it = iter(attempts)
+    skipped: List[_Attempt] = []
+    if learned:
+        for attempt in it:
+            endpoint, shape, kwargs = attempt
+            if (endpoint, shape) != learned:
+                skipped.append(attempt)
+                continue
+            resp = await _post_attempt(client, endpoint, shape, kwargs)
+            if resp is not None and resp.status_code < 400:
+                return _ok_response(resp, with_raw=with_raw)
+            if resp is not None and resp.status_code in _AUTH_FAILED:
+                # Problema de credencial, não de rota: mantém a rota e não sonda as demais.
+                logger.warning("[uazapi] auth recusada (%s) em %s; abandonando o envio", resp.status_code, endpoint)
+                return None
+            # 4xx: a instância passou a recusar o formato -> esquece a rota. Sem resposta
+            # ou 5xx é instabilidade, não mudança de contrato: mantém a rota aprendida
+            # (a descoberta abaixo ainda pode achar outra que funcione agora).
+            if resp is not None and resp.status_code < 500:
+                _LEARNED.pop((UAZAPI_BASE_URL, kind), None)
+                if _PINNED.get(kind) == learned:
+                    logger.warning("[uazapi] rota fixa p/ %s recusada (%s); descobrindo outra", kind, resp.status_code)
+                    _PINNED.pop(kind, None)
+            break
+    attempts = itertools.chain(skipped, it)
+
+    if UAZAPI_OPTIONS_PROBE:
+        attempts = await _prune_missing_endpoints(client, list(attempts))
+    if UAZAPI_PROBE_CONCURRENCY > 1 and kind not in _SEQUENTIAL_KINDS:
+        hit = await _race_endpoints(client, attempts)
+    else:
+        hit = await _first_ok(client, attempts)
+    if hit is None:
+        return None
+    endpoint, shape, resp = hit
+    if (UAZAPI_BASE_URL, kind) not in _LEARNED:
+        logger.info("[uazapi] rota aprendida: %s=%s %s (fixe com UAZAPI_PINNED_ROUTES)", kind, endpoint, shape)
+    _LEARNED[(UAZAPI_BASE_URL, kind)] = (endpoint, shape, time.monotonic())
+    return _ok_response(resp, with_raw=with_raw)
 
 
-def _chatid_variants(digits: str) -> List[str]:
-    return [f"{digits}@c.us", f"{digits}@s.whatsapp.net"]
+# =====================================================================
+#                       FILA DE REENVIO (opcional)
+# =====================================================================
+
+# True enquanto o worker da fila reexecuta um envio: a falha deve voltar para a fila
+# como exceção (para o backoff), e não gerar uma nova linha.
+_REPLAYING: contextvars.ContextVar[bool] = contextvars.ContextVar("uazapi_replaying", default=False)
+
+
+async def _queue_or_raise(fn: str, kwargs: Dict[str, Any], error: str) -> Dict[str, Any]:
+    from . import outbound_queue  # import tardio: a fila é opcional
+
+    if _REPLAYING.get() or not outbound_queue.enabled():
+        raise RuntimeError(error)
+    queue_id = await outbound_queue.enqueue(fn, kwargs)
+    logger.warning("%s; enfileirado para reenvio (id=%s)", error, queue_id)
+    return {"status": "queued", "queue_id": queue_id}
+
+
+async def _replay_queued(fn: str, kwargs: Dict[str, Any]) -> Any:
+    senders = {"send_whatsapp_message": send_whatsapp_message, "send_menu_interesse": send_menu_interesse}
+    if fn not in senders:
+        raise ValueError(f"Função de envio desconhecida na fila: {fn}")
+    token = _REPLAYING.set(True)
+    try:
+        return await senders[fn](**kwargs)
+    finally:
+        _REPLAYING.reset(token)
+
+
+async def warmup() -> None:
+    """
+    Aquece o client da UAZAPI no startup: um GET em UAZAPI_WARMUP_PATH abre a conexão
+    (TCP/TLS/HTTP2) antes do 1º envio. Nunca envia mensagem e nunca levanta.
+    """
+    if not (UAZAPI_BASE_URL and UAZAPI_TOKEN and UAZAPI_WARMUP_PATH):
+        return
+    path = _ensure_leading_slash(UAZAPI_WARMUP_PATH)
+    try:
+        resp = await _get_uazapi_client().get(path, headers=_headers(), timeout=httpx.Timeout(10.0, connect=5.0))
+    except Exception as exc:
+        logger.warning("[uazapi] warmup falhou em %s: %s", path, exc)
+        return
+    note_http_version("uazapi", resp)
+    logger.info(
+        "[uazapi] warmup %s -> %s; rotas fixas: %s",
+        path, resp.status_code, ", ".join(f"{k}={e} {s}" for k, (e, s) in _PINNED.items()) or "nenhuma",
+    )
+
+
+def start_outbound_queue() -> None:
+    """Inicia o worker da fila de reenvio (no-op sem UAZAPI_OUTBOUND_QUEUE_PATH)."""
+    from . import outbound_queue
+
+    outbound_queue.start_worker(_replay_queued)
 
 
 # =====================================================================
 #                          ENVIO – WHATSAPP
 # =====================================================================
 
+_TEXT_DESTS = ("number", "number+", "phone", "phone+", "to", "to+", "chatId", "jid")
+_TEXT_KEYS = ("text", "message", "body")
+_VIDEO_DESTS = ("number", "number+", "phone", "phone+", "jid", "chatId")
+_UPLOAD_DESTS = ("number", "number+", "phone", "phone+", "chatId", "jid")
+
+# Ordem de tentativa como dados (montada no import). Cada formato é aplicado em todos os
+# endpoints do tipo, na ordem dos endpoints; o nome do formato é o 'shape' memorizado.
+# Texto: (codificação, destino, chave do texto)
+_TEXT_SHAPES: Tuple[Tuple[str, str, str], ...] = tuple(
+    shape for shape in (
+        tuple(("json", dn, tk) for dn in _TEXT_DESTS for tk in _TEXT_KEYS)
+        + tuple(("form", dn, tk) for dn in _TEXT_DESTS for tk in _TEXT_KEYS)
+        # params + body (alguns endpoints esperam number na query)
+        + tuple(("params", dn, tk) for dn in _TEXT_DESTS for tk in ("text", "message"))
+    )
+    if shape[0] in _TRANSPORTS  # UAZAPI_TRANSPORT
+)
+# Vídeo (JSON): nome -> (chave da URL, chave da legenda); variações vistas em distros diferentes
+_VIDEO_BASES: Dict[str, Tuple[str, str]] = {
+    "file/caption": ("file", "caption"),
+    "url/caption": ("url", "caption"),
+    "file/text": ("file", "text"),
+    "url/text": ("url", "text"),
+}
+_VIDEO_SHAPES: Tuple[Tuple[str, str], ...] = tuple((bn, dn) for bn in _VIDEO_BASES for dn in _VIDEO_DESTS)
+# Multipart: destino na query (muitas instâncias exigem) e depois no body
+_UPLOAD_SHAPES: Tuple[Tuple[str, str], ...] = (
+    tuple(("query", dn) for dn in _UPLOAD_DESTS) + tuple(("form", dn) for dn in _UPLOAD_DESTS)
+)
+# Vídeo por URL não vale nos endpoints estritamente de upload de arquivo
+_VIDEO_ENDPOINTS: Tuple[str, ...] = tuple(
+    e for e in _MEDIA_ENDPOINTS if not ("sendFile" in e or "/send/file" in e or "/file/send" in e)
+)
+
+
+_JSON_CONTENT_TYPE = {"Content-Type": "application/json"}
+
+
+def _json_kwargs(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Serializa o payload uma única vez (orjson) p/ reuso entre endpoints e tentativas."""
+    return {"content": orjson.dumps(payload), "headers": _JSON_CONTENT_TYPE}
+
+
+def _lazy_attempts(
+    endpoints: Iterable[str],
+    shapes: Sequence[Tuple[str, Callable[[], Dict[str, Any]]]],
+) -> Iterator[_Attempt]:
+    """
+    Gera (endpoint, shape, kwargs) aplicando cada formato em todos os endpoints.
+    Os kwargs de um formato só são montados/serializados quando uma tentativa dele
+    é enviada (1x, reusados nos demais endpoints): com rota aprendida, só o dela.
+    """
+    memo = [(shape, lru_cache(maxsize=1)(build)) for shape, build in shapes]
+    for endpoint in endpoints:
+        for shape, build in memo:
+            yield endpoint, shape, build
+
+
+def _text_kwargs(enc: str, dest: Dict[str, str], key: str, content: str) -> Dict[str, Any]:
+    if enc == "json":
+        return _json_kwargs({**dest, key: content})
+    if enc == "form":
+        return {"data": {**dest, key: content}}
+    return {"params": dest, "data": {key: content}}
+
+
+def _text_attempts(digits: str, content: str) -> Iterator[_Attempt]:
+    dests = _dest_variants(digits)
+    shapes = [
+        (f"{enc}:{dn}/{tk}", partial(_text_kwargs, enc, dests[dn], tk, content))
+        for enc, dn, tk in _TEXT_SHAPES
+    ]
+    return _lazy_attempts(_TEXT_ENDPOINTS, shapes)
+
+
+def _video_attempts(digits: str, media_url: str, caption: str) -> List[_Attempt]:
+    dests = _dest_variants(digits)
+    shapes = []
+    for bn, dn in _VIDEO_SHAPES:
+        url_key, caption_key = _VIDEO_BASES[bn]
+        payload = {"type": "video", url_key: media_url, caption_key: caption, **dests[dn]}
+        shapes.append((f"json:{bn}/{dn}", _json_kwargs(payload)))
+    return [(endpoint, shape, kwargs) for endpoint in _VIDEO_ENDPOINTS for shape, kwargs in shapes]
+
+
+def _upload_attempts(digits: str, caption: str, files: Dict[str, Any]) -> List[_Attempt]:
+    dests = _dest_variants(digits)
+    shapes = []
+    for where, dn in _UPLOAD_SHAPES:
+        if where == "query":
+            kwargs = {"params": dests[dn], "data": {"caption": caption}, "files": files}
+        else:
+            kwargs = {"data": {**dests[dn], "caption": caption}, "files": files}
+        shapes.append((f"multipart-{where}:{dn}", kwargs))
+    return [(endpoint, shape, kwargs) for endpoint in _MEDIA_ENDPOINTS for shape, kwargs in shapes]
+
+
+def _validated_digits(phone: str) -> str:
+    """
+    Dígitos do destino, validados antes de qualquer requisição: 8–15 dígitos (E.164) p/
+    números; JIDs ("...@g.us", "...@s.whatsapp.net") só precisam ter dígitos.
+    """
+    digits = _only_digits(phone)
+    if not digits:
+        raise ValueError("Número de telefone inválido ou vazio.")
+    if "@" not in phone and not 8 <= len(digits) <= 15:
+        raise ValueError(f"Número de telefone inválido: {phone!r}")
+    return digits
+
+
+def _validate_media_url(media_url: str) -> None:
+    """Aceita http(s) com host, data: URL ou ID numérico de arquivo do Baserow."""
+    if media_url.isdigit() or media_url[:5].lower() == "data:":
+        return
+    parts = urlsplit(media_url)
+    if parts.scheme.lower() not in ("http", "https") or not parts.netloc:
+        raise ValueError(f"media_url inválida: {media_url[:100]!r}")
+
+
+# Envios idênticos em andamento: (digits, type_, hash do conteúdo) -> Task compartilhada.
+# Duplicatas concorrentes (retries de webhook) aguardam o mesmo envio em vez de repeti-lo.
+# Vale p/ texto/mídia (type_ = text|media|video...) e p/ menu (type_ = "menu").
+_INFLIGHT_SENDS: Dict[Tuple[str, str, bytes], "asyncio.Task[Dict[str, Any]]"] = {}
+
+
+def _send_key(digits: str, type_: str, *parts: Optional[str]) -> Tuple[str, str, bytes]:
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\0")
+    return digits, type_, h.digest()
+
+
+async def _within_deadline(factory: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    async with _deadline_scope():
+        return await factory()
+
+
+async def _coalesced(
+    key: Tuple[str, str, bytes],
+    deadline: Optional[float],
+    factory: Callable[[], Awaitable[Dict[str, Any]]],
+    *,
+    keep: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    Roda factory() uma vez por chave; chamadas concorrentes iguais aguardam o mesmo resultado.
+    keep > 0: após um sucesso, repetições pelos próximos 'keep' segundos recebem o mesmo
+    resultado sem reenviar (retries tardios de webhook).
+    """
+    task = _INFLIGHT_SENDS.get(key)
+    if task is None:
+        # a task copia o contexto na criação: o prazo explícito vale p/ a task inteira,
+        # esperas incluídas (sem prazo explícito, o padrão começa ao pegar o lock; ver
+        # _deadline_scope)
+        token = _DEADLINE.set(deadline)
+        try:
+            task = asyncio.ensure_future(_within_deadline(factory))
+        finally:
+            _DEADLINE.reset(token)
+        _INFLIGHT_SENDS[key] = task
+
+        def _drop(t: "asyncio.Task[Dict[str, Any]]") -> None:
+            if _INFLIGHT_SENDS.get(key) is t:
+                del _INFLIGHT_SENDS[key]
+
+        def _forget(t: "asyncio.Task[Dict[str, Any]]") -> None:
+            if keep > 0 and not t.cancelled() and t.exception() is None:
+                asyncio.get_running_loop().call_later(keep, _drop, t)
+            else:
+                _drop(t)
+
+        task.add_done_callback(_forget)
+    else:
+        logger.debug("[uazapi] envio idêntico em andamento para %s; aguardando o mesmo resultado", key[0])
+    # shield: cancelar um dos chamadores não cancela o envio compartilhado
+    return await asyncio.shield(task)
+
+
 async def send_whatsapp_message(
     phone: str,
     content: str,
@@ -211,95 +1396,60 @@ async def send_whatsapp_message(
     media_url: Optional[str] = None,
     mime_type: Optional[str] = None,
     caption: Optional[str] = None,
+    deadline: Optional[float] = None,
 ) -> Dict[str, Any]:
     """
     Envia mensagem via UAZAPI (texto, mídia, menu).
     - Para vídeo: usar type_="video" OU fornecer media_url terminando em .mp4 (MIME de vídeo).
-    Retorna dict (JSON) em sucesso; levanta RuntimeError em falha.
+    - A primeira combinação (endpoint, payload) aceita é memorizada e tentada primeiro depois.
+    - Chamadas idênticas simultâneas compartilham um único envio.
+    - deadline: instante (time.monotonic) limite p/ o envio inteiro (esperas por lock/
+      taxa, download da mídia, tentativas); esgotado, levanta RuntimeError. Padrão:
+      UAZAPI_SEND_DEADLINE contados a partir do lock do número (envios ao mesmo
+      número são serializados e a fila não consome o prazo).
+    Retorna dict (JSON) em sucesso; levanta RuntimeError em falha
+    (ou retorna {"status": "queued"} se a fila de reenvio estiver ligada).
+    Levanta ValueError, sem tocar a rede, p/ número ou media_url inválidos.
     """
+    digits = _validated_digits(phone)
+    if media_url and type_ != "text":
+        _validate_media_url(media_url)
+    key = _send_key(digits, type_, content, media_url, mime_type, caption)
+    # Mídia entregue fica "lembrada" por UAZAPI_MEDIA_DEDUP_TTL: um retry tardio não reenvia o vídeo.
+    keep = UAZAPI_MEDIA_DEDUP_TTL if media_url and type_ != "text" else 0.0
+    return await _coalesced(key, deadline, lambda: _send_whatsapp_message(
+        phone, digits, content, type_=type_, media_url=media_url, mime_type=mime_type, caption=caption,
+    ), keep=keep)
+
+
+async def _send_whatsapp_message(
+    phone: str,
+    digits: str,
+    content: str,
+    *,
+    type_: str,
+    media_url: Optional[str],
+    mime_type: Optional[str],
+    caption: Optional[str],
+) -> Dict[str, Any]:
     if not UAZAPI_BASE_URL:
         raise RuntimeError("UAZAPI_BASE_URL não configurada.")
 
-    headers = _headers()
-    digits = _only_digits(phone) or phone
-    plus_digits = digits if str(digits).startswith("+") else f"+{digits}"
+    _headers()  # falha já aqui sem UAZAPI_TOKEN; o header em si é lido a cada POST
+    client = _get_uazapi_client()
 
-    async with httpx.AsyncClient(base_url=UAZAPI_BASE_URL, timeout=UAZAPI_TIMEOUT) as client:
+    await _rate_limit()
+    async with _phone_lock(digits), _get_uazapi_bulkhead(), _deadline_scope(start=True):
         # ======================= TEXTO =======================
         if type_ == "text" or not media_url:
-            for endpoint in _text_endpoints():
-                endpoint = _ensure_leading_slash(endpoint)
-
-                # Variações de destino e conteúdo para diferentes distros
-                dest_variants: List[Dict[str, Any]] = [
-                    {"number": digits}, {"number": plus_digits},
-                    {"phone": digits},  {"phone": plus_digits},
-                    {"to": digits},     {"to": plus_digits},
-                    {"chatId": f"{digits}@c.us"},
-                    {"jid": f"{digits}@s.whatsapp.net"},
-                ]
-                text_variants: List[Dict[str, Any]] = [
-                    {"text": content},
-                    {"message": content},
-                    {"body": content},
-                ]
-
-                # (1) JSON attempts
-                for d in dest_variants:
-                    for t in text_variants:
-                        payload = {**d, **t}
-                        try:
-                            _dbg(f"[uazapi→] POST {endpoint} JSON keys={list(payload.keys())}")
-                            resp = await client.post(endpoint, json=payload, headers=headers)
-                            _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:300].replace(chr(10),' ')}")
-                            if resp.status_code < 400:
-                                try:
-                                    return resp.json()
-                                except Exception:
-                                    return {"status": "ok", "http_status": resp.status_code}
-                        except Exception as exc:
-                            print(f"[uazapi] exception on {endpoint} JSON{list(payload.keys())}: {exc}")
-
-                # (2) form-urlencoded attempts
-                for d in dest_variants:
-                    for t in text_variants:
-                        form = {**d, **t}
-                        try:
-                            _dbg(f"[uazapi→] POST {endpoint} FORM keys={list(form.keys())}")
-                            resp = await client.post(endpoint, data=form, headers=headers)
-                            _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:300].replace(chr(10),' ')}")
-                            if resp.status_code < 400:
-                                try:
-                                    return resp.json()
-                                except Exception:
-                                    return {"status": "ok", "http_status": resp.status_code}
-                        except Exception as exc:
-                            print(f"[uazapi] exception on {endpoint} FORM{list(form.keys())}: {exc}")
-
-                # (3) params + body attempts (alguns endpoints esperam number na query)
-                for d in dest_variants:
-                    try:
-                        _dbg(f"[uazapi→] POST {endpoint} PARAMS={list(d.keys())} + FORM[text]")
-                        resp = await client.post(endpoint, params=d, data={"text": content}, headers=headers)
-                        _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:300].replace(chr(10),' ')}")
-                        if resp.status_code < 400:
-                            try:
-                                return resp.json()
-                            except Exception:
-                                return {"status": "ok", "http_status": resp.status_code}
-
-                        _dbg(f"[uazapi→] POST {endpoint} PARAMS={list(d.keys())} + FORM[message]")
-                        resp = await client.post(endpoint, params=d, data={"message": content}, headers=headers)
-                        _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:300].replace(chr(10),' ')}")
-                        if resp.status_code < 400:
-                            try:
-                                return resp.json()
-                            except Exception:
-                                return {"status": "ok", "http_status": resp.status_code}
-                    except Exception as exc:
-                        print(f"[uazapi] exception on {endpoint} PARAMS{list(d.keys())}: {exc}")
-
-            raise RuntimeError(f"UAZAPI text send failed for phone={phone}")
+            result = await _try_attempts(client, "text", _text_attempts(digits, content))
+            if result is not None:
+                return result
+            return await _queue_or_raise(
+                "send_whatsapp_message",
+                {"phone": phone, "content": content, "type_": type_},
+                f"UAZAPI text send failed for phone={phone}",
+            )
 
         # ======================= MÍDIA (incl. VÍDEO) =======================
         mime = (mime_type or _infer_mime_from_url(media_url or "")) if media_url else (mime_type or "")
@@ -307,93 +1457,27 @@ async def send_whatsapp_message(
 
         # 1) Tenta JSON via /send/media para VÍDEO com media_url público (recomendado)
         if type_ == "video" or (mime and mime.startswith("video/")):
-            # Variações de payload que já vi em distros diferentes:
-            base_payloads: List[Dict[str, Any]] = [
-                {"type": "video", "file": media_url, "caption": base_caption},
-                {"type": "video", "url": media_url,  "caption": base_caption},
-                {"type": "video", "file": media_url, "text": base_caption},
-                {"type": "video", "url": media_url,  "text": base_caption},
-            ]
-            dests = [
-                {"number": digits}, {"number": plus_digits},
-                {"phone": digits},  {"phone": plus_digits},
-                {"jid": f"{digits}@s.whatsapp.net"},
-                {"chatId": f"{digits}@c.us"},
-            ]
-            for endpoint in _media_endpoints():
-                endpoint = _ensure_leading_slash(endpoint)
-                # pula variantes estritamente de upload de arquivo
-                if "sendFile" in endpoint or "/send/file" in endpoint or "/file/send" in endpoint:
-                    continue
-                for bp in base_payloads:
-                    for d in dests:
-                        payload = {**bp, **d}
-                        try:
-                            _dbg(f"[uazapi→] POST {endpoint} JSON keys={list(payload.keys())}")
-                            resp = await client.post(endpoint, json=payload, headers=headers)
-                            _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:300].replace(chr(10),' ')}")
-                            if resp.status_code < 400:
-                                try:
-                                    return resp.json()
-                                except Exception:
-                                    return {"status": "ok", "http_status": resp.status_code}
-                        except Exception as exc:
-                            print(f"[uazapi] exception on {endpoint} JSON{list(payload.keys())}: {exc}")
+            result = await _try_attempts(client, "video", _video_attempts(digits, media_url, base_caption))
+            if result is not None:
+                return result
 
         # 2) Fallback: baixa arquivo e envia multipart (cobre imagem, doc, e vídeo se necessário)
-        file_bytes, filename = await _download_bytes(media_url or "")
-        if not file_bytes:
+        #    http(s) vem em streaming p/ spool (memória/disco), sem o arquivo inteiro na RAM.
+        file_obj, filename = await _open_media(media_url or "")
+        if file_obj is None:
             raise RuntimeError("Falha ao baixar o arquivo de mídia para upload multipart.")
-        files = {"file": (filename or "file", file_bytes, mime or "application/octet-stream")}
-        async with httpx.AsyncClient(base_url=UAZAPI_BASE_URL, timeout=UAZAPI_TIMEOUT) as client2:
-            for endpoint in _media_endpoints():
-                endpoint = _ensure_leading_slash(endpoint)
-
-                # (A) 'number' na query (muitas instâncias exigem)
-                query_variants = [
-                    {"number": digits},
-                    {"number": plus_digits},
-                    {"phone": digits},
-                    {"phone": plus_digits},
-                    {"chatId": f"{digits}@c.us"},
-                    {"jid": f"{digits}@s.whatsapp.net"},
-                ]
-                for q in query_variants:
-                    try:
-                        _dbg(f"[uazapi→] POST {endpoint} QUERY={list(q.keys())} multipart")
-                        resp = await client2.post(endpoint, params=q, data={"caption": base_caption}, files=files, headers=headers)
-                        _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:300].replace(chr(10),' ')}")
-                        if resp.status_code < 400:
-                            try:
-                                return resp.json()
-                            except Exception:
-                                return {"status": "ok", "http_status": resp.status_code}
-                    except Exception as exc:
-                        print(f"[uazapi] exception on {endpoint} QUERY{list(q.keys())} multipart: {exc}")
-
-                # (B) 'number' no body (outras variantes)
-                form_variants = [
-                    {"number": digits, "caption": base_caption},
-                    {"number": plus_digits, "caption": base_caption},
-                    {"phone": digits, "caption": base_caption},
-                    {"phone": plus_digits, "caption": base_caption},
-                    {"chatId": f"{digits}@c.us", "caption": base_caption},
-                    {"jid": f"{digits}@s.whatsapp.net", "caption": base_caption},
-                ]
-                for form in form_variants:
-                    try:
-                        _dbg(f"[uazapi→] POST {endpoint} FORM keys={list(form.keys())} multipart")
-                        resp = await client2.post(endpoint, data=form, files=files, headers=headers)
-                        _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:300].replace(chr(10),' ')}")
-                        if resp.status_code < 400:
-                            try:
-                                return resp.json()
-                            except Exception:
-                                return {"status": "ok", "http_status": resp.status_code}
-                    except Exception as exc:
-                        print(f"[uazapi] exception on {endpoint} FORM{list(form.keys())}: {exc}")
-
-        raise RuntimeError(f"UAZAPI media send failed for phone={phone}")
+        with file_obj:
+            files = {"file": (filename or "file", file_obj, mime or "application/octet-stream")}
+            result = await _try_attempts(client, "media", _upload_attempts(digits, base_caption, files))
+        if result is not None:
+            return result
+
+        return await _queue_or_raise(
+            "send_whatsapp_message",
+            {"phone": phone, "content": content, "type_": type_,
+             "media_url": media_url, "mime_type": mime_type, "caption": caption},
+            f"UAZAPI media send failed for phone={phone}",
+        )
 
 
 # =====================================================================
@@ -405,73 +1489,39 @@ def _flatten_for_form(d: Dict[str, Any]) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
     for k, v in d.items():
         if isinstance(v, (dict, list)):
-            out[k] = json.dumps(v, ensure_ascii=False)
+            out[k] = orjson.dumps(v).decode()
         else:
             out[k] = v
     return out
 
 
-async def send_menu_interesse(
-    phone: str,
+def _form_kwargs(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {"data": _flatten_for_form(payload)}
+
+
+def _menu_attempts(
+    digits: str,
     text: str,
     yes_label: str,
     no_label: str,
-    footer_text: Optional[str] = None,
-) -> Dict[str, Any]:
-    """
-    Envia um menu interativo de botões (Sim/Não).
-
-    Contrato preferencial (UAZAPI GO / /send/menu):
-      {
-        "number": "55319...9",
-        "type": "button",
-        "text": "<texto>",
-        "choices": ["Sim, pode continuar|YES", "Não, encerrar contato|NO"],
-        "footerText": "opcional"
-      }
-
-    Implementa fallbacks automáticos para variações (“buttons”, “options”, etc.).
-    """
-    if not UAZAPI_BASE_URL:
-        raise RuntimeError("UAZAPI_BASE_URL não configurada.")
-    digits = _only_digits(phone)
-    if not digits:
-        raise ValueError("Número de telefone inválido ou vazio.")
+    footer_text: Optional[str],
+) -> Iterator[_Attempt]:
+    footer = {"footerText": footer_text} if footer_text else {}
+    choices = [f"{yes_label}|YES", f"{no_label}|NO"]
 
     # 0) Canonical payload (documentado)
     canonical_payload: Dict[str, Any] = {
         "number": digits,
         "type": "button",
         "text": text,
-        "choices": [
-            f"{yes_label}|YES",
-            f"{no_label}|NO",
-        ],
+        "choices": choices,
+        **footer,
     }
-    if footer_text:
-        canonical_payload["footerText"] = footer_text
-
-    async with httpx.AsyncClient(base_url=UAZAPI_BASE_URL, timeout=UAZAPI_TIMEOUT) as client:
-        # 1) Tenta canonical
-        for endpoint in _menu_endpoints():
-            ep = _ensure_leading_slash(endpoint)
-            try:
-                _dbg(f"[uazapi→] POST {ep} JSON keys={list(canonical_payload.keys())}")
-                resp = await client.post(ep, json=canonical_payload, headers=_headers())
-                _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:400].replace(chr(10),' ')}")
-                if resp.status_code < 400:
-                    try:
-                        return resp.json()
-                    except Exception:
-                        return {"status": "ok", "http_status": resp.status_code, "raw": resp.text}
-            except Exception as exc:
-                print(f"[uazapi] exception MENU {ep} JSON: {exc}")
-
-        # 2) Fallbacks (estruturas alternativas encontradas em outras distros)
-        alt_payloads: List[Dict[str, Any]] = []
 
+    # Fallbacks (estruturas alternativas encontradas em outras distros)
+    alt_payloads: List[Tuple[str, Dict[str, Any]]] = [
         # (A) type 'buttons' + array de objetos
-        alt_payloads.append({
+        ("buttons", {
             "number": digits,
             "type": "buttons",
             "text": text,
@@ -479,20 +1529,18 @@ async def send_menu_interesse(
                 {"id": "YES", "text": yes_label},
                 {"id": "NO",  "text": no_label},
             ],
-            **({"footerText": footer_text} if footer_text else {}),
-        })
-
+            **footer,
+        }),
         # (B) type 'button' + 'options' (strings simples, alguns servers ignoram IDs)
-        alt_payloads.append({
+        ("options", {
             "number": digits,
             "type": "button",
             "text": text,
             "options": [yes_label, no_label],
-            **({"footerText": footer_text} if footer_text else {}),
-        })
-
+            **footer,
+        }),
         # (C) 'choices' como lista de dicts
-        alt_payloads.append({
+        ("choices-obj", {
             "number": digits,
             "type": "button",
             "text": text,
@@ -500,56 +1548,92 @@ async def send_menu_interesse(
                 {"id": "YES", "title": yes_label},
                 {"id": "NO",  "title": no_label},
             ],
-            **({"footerText": footer_text} if footer_text else {}),
-        })
-
-        # (D) Variação de destino: phone / to / chatId
-        alt_dest_variants = [
-            {"phone": digits}, {"to": digits},
-            {"chatId": f"{digits}@c.us"}, {"jid": f"{digits}@s.whatsapp.net"}
-        ]
-        alt_base = {
-            "type": "button",
-            "text": text,
-            "choices": [f"{yes_label}|YES", f"{no_label}|NO"],
-            **({"footerText": footer_text} if footer_text else {}),
-        }
-        for d in alt_dest_variants:
-            alt_payloads.append({**alt_base, **d})
-
-        for endpoint in _menu_endpoints():
-            ep = _ensure_leading_slash(endpoint)
-            # JSON
-            for payload in alt_payloads:
-                try:
-                    _dbg(f"[uazapi→] POST {ep} JSON-ALT keys={list(payload.keys())}")
-                    resp = await client.post(ep, json=payload, headers=_headers())
-                    _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:400].replace(chr(10),' ')}")
-                    if resp.status_code < 400:
-                        try:
-                            return resp.json()
-                        except Exception:
-                            return {"status": "ok", "http_status": resp.status_code, "raw": resp.text}
-                except Exception as exc:
-                    print(f"[uazapi] exception MENU {ep} JSON-ALT: {exc}")
+            **footer,
+        }),
+    ]
+
+    # (D) Variação de destino: phone / to / chatId / jid
+    dests = _dest_variants(digits)
+    alt_base = {
+        "type": "button",
+        "text": text,
+        "choices": choices,
+        **footer,
+    }
+    for dn in ("phone", "to", "chatId", "jid"):
+        alt_payloads.append((f"choices/{dn}", {**alt_base, **dests[dn]}))
+
+    # 1) Canonical em todos os endpoints (sempre JSON: é o contrato documentado)
+    yield from _lazy_attempts(
+        _MENU_ENDPOINTS, [("json:canonical", partial(_json_kwargs, canonical_payload))]
+    )
+    # 2) Alternativos: JSON e FORM (algumas distros esperam form-urlencoded), cf. UAZAPI_TRANSPORT.
+    #    Serializados/achatados só se a descoberta chegar até eles.
+    alt_shapes: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+    if "json" in _TRANSPORTS:
+        alt_shapes += [(f"json:{name}", partial(_json_kwargs, payload)) for name, payload in alt_payloads]
+    if "form" in _TRANSPORTS:
+        alt_shapes += [(f"form:{name}", partial(_form_kwargs, payload)) for name, payload in alt_payloads]
+    yield from _lazy_attempts(_MENU_ENDPOINTS, alt_shapes)
 
-            # FORM (algumas distros esperam form-urlencoded)
-            form_payloads = [_flatten_for_form(p) for p in alt_payloads]
-            for form in form_payloads:
-                try:
-                    _dbg(f"[uazapi→] POST {ep} FORM-ALT keys={list(form.keys())}")
-                    resp = await client.post(ep, data=form, headers=_headers())
-                    _dbg(f"[uazapi←] {resp.status_code} body={resp.text[:400].replace(chr(10),' ')}")
-                    if resp.status_code < 400:
-                        try:
-                            return resp.json()
-                        except Exception:
-                            return {"status": "ok", "http_status": resp.status_code, "raw": resp.text}
-                except Exception as exc:
-                    print(f"[uazapi] exception MENU {ep} FORM-ALT: {exc}")
+
+async def send_menu_interesse(
+    phone: str,
+    text: str,
+    yes_label: str,
+    no_label: str,
+    footer_text: Optional[str] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Envia um menu interativo de botões (Sim/Não).
+
+    Contrato preferencial (UAZAPI GO / /send/menu):
+      {
+        "number": "55319...9",
+        "type": "button",
+        "text": "<texto>",
+        "choices": ["Sim, pode continuar|YES", "Não, encerrar contato|NO"],
+        "footerText": "opcional"
+      }
+
+    Implementa fallbacks automáticos para variações (“buttons”, “options”, etc.).
+    deadline: como em send_whatsapp_message; menus idênticos simultâneos também
+    compartilham um único envio.
+    """
+    if not UAZAPI_BASE_URL:
+        raise RuntimeError("UAZAPI_BASE_URL não configurada.")
+    digits = _validated_digits(phone)
+
+    key = _send_key(digits, "menu", text, yes_label, no_label, footer_text)
+    return await _coalesced(key, deadline, lambda: _send_menu_interesse(
+        phone, digits, text, yes_label, no_label, footer_text,
+    ))
+
+
+async def _send_menu_interesse(
+    phone: str,
+    digits: str,
+    text: str,
+    yes_label: str,
+    no_label: str,
+    footer_text: Optional[str],
+) -> Dict[str, Any]:
+    _headers()  # falha já aqui sem UAZAPI_TOKEN; o header em si é lido a cada POST
+    attempts = _menu_attempts(digits, text, yes_label, no_label, footer_text)
+    client = _get_uazapi_client()
+    await _rate_limit()
+    async with _phone_lock(digits), _get_uazapi_bulkhead(), _deadline_scope(start=True):
+        result = await _try_attempts(client, "menu", attempts, with_raw=True)
+    if result is not None:
+        return result
 
     # Se chegou aqui, falhou
-    raise RuntimeError(f"UAZAPI menu send failed for phone={phone}")
+    return await _queue_or_raise(
+        "send_menu_interesse",
+        {"phone": phone, "text": text, "yes_label": yes_label, "no_label": no_label, "footer_text": footer_text},
+        f"UAZAPI menu send failed for phone={phone}",
+    )
 
 
 # =====================================================================
@@ -562,6 +1646,7 @@ async def send_message(
     text: str,
     media_url: Optional[str] = None,
     mime_type: Optional[str] = None,
+    deadline: Optional[float] = None,
 ) -> Dict[str, Any]:
     """
     Alias retrocompatível:
@@ -579,8 +1664,63 @@ async def send_message(
             media_url=media_url,
             mime_type=mime_type,
             caption=text,
+            deadline=deadline,
         )
-    return await send_whatsapp_message(phone=phone, content=text, type_="text")
+    return await send_whatsapp_message(phone=phone, content=text, type_="text", deadline=deadline)
+
+
+async def send_bulk(
+    items: Iterable[Dict[str, Any]],
+    *,
+    max_concurrency: int = 20,
+    mps: float = 50.0,
+    burst: Optional[float] = None,
+    **common: Any,
+) -> List[Any]:
+    """
+    Dispara vários envios em paralelo, com no máximo `max_concurrency` simultâneos
+    e no máximo `mps` envios/s neste lote (token bucket; 0 = sem teto por lote), p/ uma
+    campanha não estourar o throttle da instância. `burst`: quantos saem de imediato
+    antes de o ritmo valer (padrão: mps; 1 = ritmo constante desde o início). O teto
+    global UAZAPI_RATE_MPS, se ligado, continua valendo por cima.
+    Cada item são os kwargs de send_whatsapp_message (ex.: {"phone": ..., "content": ...});
+    `common` vale para todos os itens (broadcast: send_bulk([{"phone": p} ...], content=...)),
+    e o que vier no item prevalece.
+    Retorna os resultados na mesma ordem; falhas vêm como a exceção correspondente.
+    """
+    sem = asyncio.Semaphore(max(1, max_concurrency))
+    limiter = _TokenBucket(mps, burst) if mps and mps > 0 else None
+
+    async def _one(item: Dict[str, Any]) -> Dict[str, Any]:
+        async with sem:
+            if limiter is not None:
+                await limiter.acquire()
+            return await send_whatsapp_message(**{**common, **item})
+
+    return await asyncio.gather(*(_one(it) for it in items), return_exceptions=True)
+
+
+async def send_broadcast(
+    phones: Iterable[str],
+    content: str,
+    *,
+    concurrency: int = 20,
+    mps: float = 50.0,
+    burst: Optional[float] = None,
+    **kwargs: Any,
+) -> List[Tuple[str, Any]]:
+    """
+    Mesmo conteúdo p/ vários números, via send_bulk (mesmos limites de concorrência e taxa).
+    kwargs extras vão para send_whatsapp_message (type_, media_url, caption...).
+    Retorna (phone, resultado) por destinatário, na ordem recebida; falhas vêm como a
+    exceção correspondente, p/ o chamador reenviar só esses números.
+    """
+    phones = list(phones)
+    results = await send_bulk(
+        [{"phone": p} for p in phones],
+        max_concurrency=concurrency, mps=mps, burst=burst, content=content, **kwargs,
+    )
+    return list(zip(phones, results))
 
 
 def normalize_number(s: str) -> str:
@@ -592,6 +1732,101 @@ def normalize_number(s: str) -> str:
 #                        BASEROW – UPLOAD/RESOLVE
 # =====================================================================
 
+# GET é idempotente: repete também em 5xx de gateway e em qualquer erro de transporte.
+# Upload (POST) só repete quando o Baserow certamente não processou (como na UAZAPI).
+_BASEROW_GET_RETRY_STATUS = _TRANSIENT_STATUS | {500, 502, 504}
+
+
+async def _baserow_request(client: httpx.AsyncClient, method: str, path: str, **kwargs: Any) -> httpx.Response:
+    """Requisição ao Baserow com retry/backoff (UAZAPI_RETRY_*); levanta a última exceção."""
+    idempotent = method == "GET"
+    retry_status = _BASEROW_GET_RETRY_STATUS if idempotent else _TRANSIENT_STATUS
+    retry_exc = httpx.TransportError if idempotent else (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    for attempt in range(_RETRY_MAX_TRIES):
+        last = attempt == _RETRY_MAX_TRIES - 1
+        _rewind_files(kwargs)
+        logger.debug("[baserow→] %s %s", method, path)
+        try:
+            resp = await client.request(method, path, **kwargs)
+        except retry_exc:
+            if last or not await _backoff(attempt, None):
+                raise
+            continue
+        note_http_version("baserow", resp)
+        _log_response("baserow", resp)
+        if resp.status_code in retry_status and not last and await _backoff(attempt, resp):
+            continue
+        return resp
+    raise AssertionError("unreachable")
+
+
+async def _baserow_get_first(
+    client: httpx.AsyncClient,
+    paths: List[str],
+) -> Optional[Dict[str, Any]]:
+    """
+    Dispara os GETs candidatos em paralelo e devolve o primeiro que responder < 400
+    (asyncio.wait FIRST_COMPLETED); os demais são cancelados. Só para GETs, que são
+    idempotentes — uploads continuam sequenciais para não duplicar arquivos.
+    """
+    async def _get(path: str) -> Optional[Dict[str, Any]]:
+        resp = await _baserow_request(client, "GET", path)
+        if resp.status_code >= 400:
+            return None
+        try:
+            return orjson.loads(resp.content)
+        except Exception:
+            # pode ser um redirect/arquivo binário; nesse caso, fornece URL direta
+            return {"url": f"{BASEROW_BASE_URL}{path}"}
+
+    pending = {asyncio.create_task(_get(p)): p for p in paths}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=UAZAPI_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.warning("[baserow] timeout resolvendo %s", list(pending.values()))
+                return None
+            for task in done:
+                path = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as exc:
+                    logger.warning("[baserow] exception GET %s: %s", path, exc)
+                    continue
+                if result is not None:
+                    return result
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# Metadados de arquivo do Baserow resolvidos por ID: (base_url, id) -> (expira_em, dict).
+# Reenvios da mesma mídia não repetem os GETs; só respostas positivas são guardadas.
+_BASEROW_META: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+_BASEROW_META_MAX = 1024
+
+
+async def _baserow_file_meta(client: httpx.AsyncClient, file_id: str) -> Optional[Dict[str, Any]]:
+    key = (BASEROW_BASE_URL, file_id)
+    hit = _BASEROW_META.get(key)
+    now = time.monotonic()
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    candidates = [
+        f"/api/database/files/{file_id}/",    # algumas instalações expõem este endpoint
+        f"/api/user-files/{file_id}/",        # variação
+        f"/api/user-files/file/{file_id}/",   # variação
+    ]
+    meta = await _baserow_get_first(client, candidates)
+    if meta is not None and BASEROW_META_TTL > 0:
+        if len(_BASEROW_META) >= _BASEROW_META_MAX:
+            for k in [k for k, (exp, _) in _BASEROW_META.items() if exp <= now] or list(_BASEROW_META)[:1]:
+                del _BASEROW_META[k]
+        _BASEROW_META[key] = (now + BASEROW_META_TTL, meta)
+    return meta
+
+
 async def upload_file_to_baserow(source: str) -> Optional[Dict[str, Any]]:
     """
     Faz upload de um arquivo para o Baserow (quando 'source' é uma URL http/https ou data:),
@@ -604,62 +1839,42 @@ async def upload_file_to_baserow(source: str) -> Optional[Dict[str, Any]]:
     Retorna dict (JSON) do Baserow (contendo ao menos 'url' e/ou 'name') ou None em falha.
     """
     if not BASEROW_BASE_URL or not BASEROW_API_TOKEN:
-        print("[baserow] não configurado: BASEROW_BASE_URL/BASEROW_API_TOKEN ausentes")
+        logger.warning("[baserow] não configurado: BASEROW_BASE_URL/BASEROW_API_TOKEN ausentes")
         return None
 
-    headers = {"Authorization": f"Token {BASEROW_API_TOKEN}"}
+    client = _get_baserow_client()
 
     try:
-        async with httpx.AsyncClient(base_url=BASEROW_BASE_URL, timeout=UAZAPI_TIMEOUT) as client:
+        async with _get_baserow_bulkhead():
             # Caso seja um ID numérico -> tenta resolver metadados/URL por endpoints comuns
             if str(source).isdigit():
-                candidates = [
-                    f"/api/database/files/{source}/",    # algumas instalações expõem este endpoint
-                    f"/api/user-files/{source}/",        # variação
-                    f"/api/user-files/file/{source}/",   # variação
-                ]
-                for path in candidates:
-                    try:
-                        _dbg(f"[baserow→] GET {path}")
-                        resp = await client.get(path, headers=headers)
-                        _dbg(f"[baserow←] {resp.status_code} body={resp.text[:300].replace(chr(10),' ')}")
-                        if resp.status_code < 400:
-                            try:
-                                return resp.json()
-                            except Exception:
-                                # pode ser um redirect/arquivo binário; nesse caso, fornece URL direta
-                                return {"url": f"{BASEROW_BASE_URL}{path}"}
-                    except Exception as exc:
-                        print(f"[baserow] exception GET {path}: {exc}")
-                return None
+                return await _baserow_file_meta(client, str(source))
 
-            # Caso contrário, trata 'source' como URL -> baixa e faz upload para user-files
-            # Baixa bytes da URL (ou data:) reaproveitando o utilitário local
-            file_bytes, filename = await _download_bytes(source)
-            if not file_bytes:
-                print("[baserow] falha ao baixar fonte para upload")
+            # Caso contrário, trata 'source' como URL -> baixa e faz upload para user-files.
+            # http(s) é baixado em streaming (spool memória/disco); data: já está em memória.
+            file_obj, filename = await _open_media(source)
+            if file_obj is None:
+                logger.warning("[baserow] falha ao baixar fonte para upload")
                 return None
 
-            files = {"file": (filename or "file", file_bytes)}
             upload_endpoints = [
                 "/api/user-files/upload-file/",   # endpoint canônico (cloud/self-host)
                 "/api/userfiles/upload_file/",    # variação legacy
             ]
-            for upath in upload_endpoints:
-                try:
-                    _dbg(f"[baserow→] POST {upath} multipart")
-                    up = await client.post(upath, files=files, headers=headers)
-                    _dbg(f"[baserow←] {up.status_code} body={up.text[:300].replace(chr(10),' ')}")
-                    if up.status_code < 400:
-                        try:
-                            return up.json()
-                        except Exception:
-                            # Em cenários raros, retorna vazio com 200
-                            return {"status": "ok", "http_status": up.status_code}
-                except Exception as exc:
-                    print(f"[baserow] exception POST {upath}: {exc}")
+            with file_obj:
+                for upath in upload_endpoints:
+                    try:
+                        up = await _baserow_request(client, "POST", upath, files={"file": (filename or "file", file_obj)})
+                        if up.status_code < 400:
+                            try:
+                                return orjson.loads(up.content)
+                            except Exception:
+                                # Em cenários raros, retorna vazio com 200
+                                return {"status": "ok", "http_status": up.status_code}
+                    except Exception as exc:
+                        logger.warning("[baserow] exception POST %s: %s", upath, exc)
             return None
 
     except Exception as exc:
-        print(f"[baserow] erro inesperado: {exc}")
+        logger.warning("[baserow] erro inesperado: %s", exc)
         return None